@@ -45,7 +45,7 @@ echo -e "${GREEN}✓ 目录结构已创建${NC}"
 # 3. 安装 Python 依赖
 echo -e "\n${YELLOW}[3/6] 安装 Python 依赖...${NC}"
 cd $INSTALL_DIR
-pip3 install -q fastapi uvicorn httpx python-dotenv requests
+pip3 install -q fastapi 'uvicorn[standard]' 'httpx[http2]' python-dotenv requests orjson
 echo -e "${GREEN}✓ 依赖安装完成${NC}"
 
 # 4. 创建配置文件
@@ -81,7 +81,7 @@ After=network.target
 Type=simple
 User=$SERVICE_USER
 WorkingDirectory=$INSTALL_DIR
-ExecStart=/usr/bin/python3 -m uvicorn src.proxy.server:app --host 0.0.0.0 --port 3001 --log-level info
+ExecStart=/usr/bin/python3 -m uvicorn src.proxy.server:app --host 0.0.0.0 --port 3001 --loop uvloop --http httptools --log-level info
 Restart=always
 RestartSec=5
 Environment="PYTHONPATH=$INSTALL_DIR"
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+调度逻辑自检
+使用假时钟检查刷新器的限速器 / AIMD 并发控制，以及代理的密钥轮询和冷却堆，
+不发出任何网络请求。
+
+用法: python3 scripts/selfcheck.py
+"""
+
+import asyncio
+import heapq
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from src.refresher.key_refresher import AdaptiveConcurrencyLimiter, SlidingWindowLimiter  # noqa: E402
+import src.proxy.server as server  # noqa: E402
+
+
+class FakeClock:
+    """假时钟：sleep 直接把时间往前拨，并记录每次等待的秒数"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+        self.slept = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+        await asyncio.sleep(0)
+
+
+async def _yield(times: int = 5):
+    """让出事件循环若干次，让其他任务运行到下一个等待点"""
+    for _ in range(times):
+        await asyncio.sleep(0)
+
+
+# ============== 刷新器：滑动窗口限速 ==============
+async def check_sliding_window_limiter():
+    clock = FakeClock()
+    limiter = SlidingWindowLimiter(3, window=60.0, clock=clock, sleep=clock.sleep)
+
+    # 窗口内前 3 个请求直接放行，第 4 个等到最早的请求滑出窗口
+    for _ in range(3):
+        await limiter.wait()
+    assert clock.slept == [], clock.slept
+    await limiter.wait()
+    assert clock.slept == [60.0], clock.slept
+
+    # 滑动窗口而非固定窗口：t=1060 的请求在 t=1120 才过期
+    clock.slept.clear()
+    clock.now = 1100.0
+    await limiter.wait()
+    await limiter.wait()
+    assert clock.slept == [], clock.slept
+    await limiter.wait()
+    assert clock.slept == [20.0], clock.slept
+
+    # retry-after 暂停对之后的请求生效
+    clock.slept.clear()
+    clock.now = 2000.0
+    limiter.pause(5)
+    await limiter.wait()
+    assert clock.slept == [5.0], clock.slept
+
+    # rpm <= 0 不限速，也不记录发送时间
+    unlimited = SlidingWindowLimiter(0, clock=clock, sleep=clock.sleep)
+    for _ in range(100):
+        await unlimited.wait()
+    assert not unlimited._sent
+
+
+# ============== 刷新器：AIMD 并发控制 ==============
+async def check_adaptive_concurrency():
+    clock = FakeClock()
+    limiter = AdaptiveConcurrencyLimiter(
+        4, latency_target=1.0, window=2, failure_threshold=3, open_seconds=5.0,
+        clock=clock, sleep=clock.sleep
+    )
+
+    # 名额用完后新的请求等待，有名额归还才放行
+    for _ in range(4):
+        await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await _yield()
+    assert not waiter.done()
+    limiter.release(0.1, 200)
+    await _yield()
+    assert waiter.done()
+    assert limiter.limit == 4  # 已在上限，不再增加
+
+    # 过载减半（不低于下限），正常响应每次 +0.5
+    limiter.release(0.1, 429)
+    assert limiter.limit == 2.0, limiter.limit
+    limiter.release(0.1, 200)
+    assert limiter.limit == 2.5, limiter.limit
+
+    # 在途请求多于新上限时，要等降到上限以下才放行
+    assert limiter._in_flight == 2
+    blocked = asyncio.ensure_future(limiter.acquire())
+    await _yield()
+    assert not blocked.done()
+    limiter.release(0.1, 200)
+    await _yield()
+    assert blocked.done() and limiter._in_flight == 2
+
+    # 非过载的错误（如 401）不调整并发数，但会清零连续出错次数
+    limit = limiter.limit
+    limiter.release(0.1, 401)
+    limiter.release(0.1, 401)
+    assert limiter.limit == limit and limiter._failures == 0
+    assert limiter._in_flight == 0
+
+    # 平均延迟超过目标时即使 200 也减半；窗口内延迟降下来后恢复增长
+    limiter.limit = 4.0
+    limiter._in_flight = 2
+    limiter.release(5.0, 200)
+    assert limiter.limit == 2.0, limiter.limit
+    limiter.release(0.1, 200)  # 窗口 [5.0, 0.1] 均值仍超过目标
+    assert limiter.limit == 1.0, limiter.limit
+    for _ in range(2):
+        await limiter.acquire()
+        limiter.release(0.1, 200)
+    assert limiter.limit == 2.0, limiter.limit
+
+    # 连续出错超过阈值后熔断，熔断期间的请求等到截止时间后才放行
+    for _ in range(4):
+        limiter._in_flight += 1
+        limiter.release(0.1, None)
+    assert limiter.limit == limiter.min_limit
+    assert limiter._open_until == clock.now + 5.0
+    assert limiter._failures == 0
+    clock.slept.clear()
+    await limiter.acquire()
+    assert clock.slept == [5.0], clock.slept
+    limiter.release(0.1, 200)
+
+
+# ============== 代理：密钥轮询和冷却堆 ==============
+def check_key_rotation_and_cooldown():
+    server.api_keys = ["key-a", "key-b", "key-c"]
+    server.cooldown_keys = {}
+    server.rebuild_cooldown_heap()
+    server.rebuild_available_keys()
+
+    # 轮询
+    picked = [server.get_next_key() for _ in range(4)]
+    assert picked == ["key-a", "key-b", "key-c", "key-a"], picked
+
+    # 冷却中的密钥不参与轮询
+    server.add_to_cooldown("key-b")
+    first_until = server.cooldown_keys["key-b"]
+    picked = {server.get_next_key() for _ in range(4)}
+    assert picked == {"key-a", "key-c"}, picked
+
+    # 再次加入冷却（与 add_to_cooldown 相同的操作）会在堆里留下旧记录，
+    # 旧记录到期时密钥仍在冷却中
+    server.cooldown_keys["key-b"] = first_until + 100
+    heapq.heappush(server.cooldown_heap, (first_until + 100, "key-b"))
+    server.release_expired_cooldowns(first_until)
+    assert "key-b" in server.cooldown_keys
+    assert list(server.available_keys).count("key-b") == 0
+
+    # 最新的截止时间到期后放回队列，且只放回一次
+    server.cooldown_dirty = False
+    server.release_expired_cooldowns(first_until + 100)
+    assert "key-b" not in server.cooldown_keys
+    assert list(server.available_keys).count("key-b") == 1
+    assert server.cooldown_dirty
+    assert not server.cooldown_heap
+
+    # 冷却期间已从密钥文件删除的密钥，到期后不再放回
+    server.add_to_cooldown("key-c")
+    until = server.cooldown_keys["key-c"]
+    server.api_keys = ["key-a", "key-b"]
+    server.release_expired_cooldowns(until)
+    assert "key-c" not in server.available_keys
+    assert "key-c" not in server.cooldown_keys
+
+    # 已过期的冷却记录在取密钥时自动释放
+    server.api_keys = ["key-a"]
+    server.cooldown_keys = {"key-a": 0.0}
+    server.rebuild_cooldown_heap()
+    server.rebuild_available_keys()
+    assert not server.available_keys
+    assert server.get_next_key() == "key-a"
+
+
+def main():
+    asyncio.run(check_sliding_window_limiter())
+    print("✅ 滑动窗口限速")
+    asyncio.run(check_adaptive_concurrency())
+    print("✅ AIMD 并发控制")
+    check_key_rotation_and_cooldown()
+    print("✅ 密钥轮询和冷却")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,16 +5,22 @@ Vercel API Key 余额检查工具
 检查所有密钥余额并按范围分类保存
 """
 
-import requests
-import json
+import asyncio
+import bisect
+import itertools
+import httpx
+import orjson
 import time
 import os
 import sys
 import warnings
+from operator import itemgetter
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import MappingProxyType
 from datetime import datetime
 
+from src.keyfile import load_key_file
+
 warnings.filterwarnings('ignore')
 
 # 配置
@@ -23,6 +29,25 @@ DATA_DIR = BASE_DIR / "data"
 KEYS_DIR = DATA_DIR / "keys"
 REPORTS_DIR = DATA_DIR / "reports"
 
+# 余额分类区间: [-inf, 0.01) zero, [0.01, 1) low, [1, 2) medium, [2, 3) medium_high, [3, +inf) high
+BALANCE_BOUNDARIES = (0.01, 1, 2, 3)
+BALANCE_CATEGORY_KEYS = ("zero", "low", "medium", "medium_high", "high")
+
+# 分类显示名称（按余额从高到低）
+BALANCE_CATEGORY_NAMES = MappingProxyType({
+    "high": "$3+",
+    "medium_high": "$2-3",
+    "medium": "$1-2",
+    "low": "$0-1",
+    "zero": "$0",
+})
+
+# 写入 active_keys.txt 的分类（余额 > 0，按余额从高到低）
+ACTIVE_CATEGORY_KEYS = ("high", "medium_high", "medium", "low")
+
+# 进度输出批量大小
+PROGRESS_BATCH_SIZE = 50
+
 # 确保目录存在
 KEYS_DIR.mkdir(parents=True, exist_ok=True)
 REPORTS_DIR.mkdir(parents=True, exist_ok=True)
@@ -31,66 +56,116 @@ REPORTS_DIR.mkdir(parents=True, exist_ok=True)
 class VercelBillingChecker:
     def __init__(self):
         self.base_url = "https://ai-gateway.vercel.sh/v1"
+        self.credits_url = f"{self.base_url}/credits"
         self.headers_template = {
             "Content-Type": "application/json",
             "User-Agent": "vercel-billing-checker/2.0"
         }
 
-    def check_single_key(self, api_key: str) -> dict:
-        """检查单个密钥的余额"""
-        headers = self.headers_template.copy()
-        headers["Authorization"] = f"Bearer {api_key}"
-
-        try:
-            response = requests.get(
-                f"{self.base_url}/credits",
-                headers=headers,
-                timeout=15
-            )
-
-            if response.status_code == 200:
-                data = response.json()
-                balance = float(data.get("balance", 0))
-                total_used = float(data.get("total_used", 0))
-                total_limit = balance + total_used
-                usage_percentage = round(total_used / total_limit * 100, 2) if total_limit > 0 else 0
-
-                return {
-                    "key": api_key,
-                    "key_short": api_key[:16] + "..." + api_key[-4:],
-                    "status": "success",
-                    "balance": balance,
-                    "total_used": total_used,
-                    "total_limit": total_limit,
-                    "usage_percentage": usage_percentage
-                }
-            else:
-                return {
-                    "key": api_key,
-                    "key_short": api_key[:16] + "...",
-                    "status": "error",
-                    "error": f"HTTP {response.status_code}: {response.text[:100]}"
-                }
+    def _create_client(self, concurrency: int) -> httpx.AsyncClient:
+        """创建检查用的客户端：连接池大小与并发数一致，连接失败时重试 2 次"""
+        limits = httpx.Limits(
+            max_connections=concurrency,
+            max_keepalive_connections=concurrency
+        )
+        transport = httpx.AsyncHTTPTransport(retries=2, limits=limits)
+        return httpx.AsyncClient(
+            headers=self.headers_template,
+            timeout=15,
+            transport=transport
+        )
+
+    def _success_result(self, api_key: str, data: dict) -> dict:
+        """根据 /credits 响应构建成功结果"""
+        balance = float(data.get("balance", 0))
+        total_used = float(data.get("total_used", 0))
+        total_limit = balance + total_used
+        usage_percentage = round(total_used / total_limit * 100, 2) if total_limit > 0 else 0
+
+        return {
+            "key": api_key,
+            "key_short": api_key[:16] + "..." + api_key[-4:],
+            "status": "success",
+            "balance": balance,
+            "total_used": total_used,
+            "total_limit": total_limit,
+            "usage_percentage": usage_percentage
+        }
+
+    def _error_result(self, api_key: str, error: str) -> dict:
+        """构建失败结果"""
+        return {
+            "key": api_key,
+            "key_short": api_key[:16] + "...",
+            "status": "error",
+            "error": error
+        }
 
-        except requests.exceptions.Timeout:
-            return {
-                "key": api_key,
-                "key_short": api_key[:16] + "...",
-                "status": "error",
-                "error": "请求超时"
-            }
-        except Exception as e:
-            return {
-                "key": api_key,
-                "key_short": api_key[:16] + "...",
-                "status": "error",
-                "error": str(e)
-            }
-
-    def check_multiple_keys(self, api_keys: list, max_workers: int = 5) -> list:
-        """批量检查多个密钥"""
+    def check_single_key(self, api_key: str) -> dict:
+        """检查单个密钥的余额（与批量检查使用同一套请求和重试逻辑）"""
+        async def check() -> dict:
+            async with self._create_client(1) as client:
+                return await self._check_single_key_async(client, asyncio.Semaphore(1), api_key)
+
+        return asyncio.run(check())
+
+    async def _check_single_key_async(
+        self,
+        client: httpx.AsyncClient,
+        semaphore: asyncio.Semaphore,
+        api_key: str
+    ) -> dict:
+        """异步检查单个密钥的余额（批量检查使用）"""
+        async with semaphore:
+            try:
+                response = await client.get(
+                    self.credits_url,
+                    headers={"Authorization": f"Bearer {api_key}"}
+                )
+
+                if response.status_code == 200:
+                    return self._success_result(api_key, orjson.loads(response.content))
+                return self._error_result(api_key, f"HTTP {response.status_code}: {response.text[:100]}")
+
+            except httpx.TimeoutException:
+                return self._error_result(api_key, "请求超时")
+            except Exception as e:
+                return self._error_result(api_key, str(e))
+
+    async def _check_all_keys(self, api_keys: list, concurrency: int) -> list:
+        """在单个事件循环中并发检查所有密钥，共享同一个连接池"""
         results = []
         total = len(api_keys)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async with self._create_client(concurrency) as client:
+            tasks = [
+                asyncio.create_task(self._check_single_key_async(client, semaphore, key))
+                for key in api_keys
+            ]
+
+            # 进度信息先缓存，每 PROGRESS_BATCH_SIZE 条统一输出一次，减少终端写入
+            pending_lines = []
+            for completed, future in enumerate(asyncio.as_completed(tasks), 1):
+                result = await future
+                results.append(result)
+
+                progress = f"[{completed}/{total}]"
+                if result["status"] == "success":
+                    pending_lines.append(f"{progress} ✅ {result['key_short']} - 余额: ${result['balance']:.2f}")
+                else:
+                    pending_lines.append(f"{progress} ❌ {result['key_short']} - {result['error'][:50]}")
+
+                if len(pending_lines) >= PROGRESS_BATCH_SIZE or completed == total:
+                    sys.stdout.write("\n".join(pending_lines) + "\n")
+                    sys.stdout.flush()
+                    pending_lines.clear()
+
+        return results
+
+    def check_multiple_keys(self, api_keys: list, max_workers: int = 20) -> list:
+        """批量检查多个密钥（max_workers 为同时进行的请求数）"""
+        total = len(api_keys)
 
         print(f"\n{'='*60}")
         print(f"开始检查 {total} 个 Vercel API Key")
@@ -99,24 +174,7 @@ class VercelBillingChecker:
 
         start_time = time.time()
 
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_key = {
-                executor.submit(self.check_single_key, key): key 
-                for key in api_keys
-            }
-            
-            completed = 0
-            for future in as_completed(future_to_key):
-                result = future.result()
-                results.append(result)
-                completed += 1
-                
-                # 显示进度
-                progress = f"[{completed}/{total}]"
-                if result["status"] == "success":
-                    print(f"{progress} ✅ {result['key_short']} - 余额: ${result['balance']:.2f}")
-                else:
-                    print(f"{progress} ❌ {result['key_short']} - {result['error'][:50]}")
+        results = asyncio.run(self._check_all_keys(api_keys, max_workers))
 
         elapsed = time.time() - start_time
         print(f"\n检查完成，耗时: {elapsed:.1f} 秒")
@@ -125,8 +183,14 @@ class VercelBillingChecker:
 
     def generate_report(self, results: list) -> dict:
         """生成报告并保存分类文件"""
-        successful = [r for r in results if r["status"] == "success"]
-        failed = [r for r in results if r["status"] == "error"]
+        # 一次遍历拆分成功 / 失败结果
+        successful = []
+        failed = []
+        for r in results:
+            (successful if r["status"] == "success" else failed).append(r)
+
+        # 按余额从高到低原地排序（分类、Top 10 和 JSON 报告共用，不再复制列表）
+        successful.sort(key=itemgetter("balance"), reverse=True)
 
         print(f"\n{'='*60}")
         print("📊 检查完成 - 统计报告")
@@ -144,10 +208,19 @@ class VercelBillingChecker:
         }
 
         if successful:
-            total_balance = sum(r["balance"] for r in successful)
-            total_used = sum(r["total_used"] for r in successful)
-            total_limit = sum(r["total_limit"] for r in successful)
-            
+            # 按余额分类（每次运行只新建各分类的密钥列表）
+            category_keys = {cat_key: [] for cat_key in BALANCE_CATEGORY_NAMES}
+
+            # 一次遍历同时完成金额累加和分类（bisect 直接定位余额区间）
+            total_balance = total_used = total_limit = 0.0
+            for r in successful:
+                balance = r["balance"]
+                total_balance += balance
+                total_used += r["total_used"]
+                total_limit += r["total_limit"]
+                cat_key = BALANCE_CATEGORY_KEYS[bisect.bisect_right(BALANCE_BOUNDARIES, balance)]
+                category_keys[cat_key].append(r["key"])
+
             summary["total_balance"] = round(total_balance, 2)
             summary["total_used"] = round(total_used, 2)
             summary["total_limit"] = round(total_limit, 2)
@@ -157,36 +230,17 @@ class VercelBillingChecker:
             print(f"   总已用: ${total_used:.2f}")
             print(f"   总额度: ${total_limit:.2f}")
 
-            # 按余额分类
-            categories = {
-                "high": {"name": "$3+", "min": 3, "max": float('inf'), "keys": []},
-                "medium_high": {"name": "$2-3", "min": 2, "max": 3, "keys": []},
-                "medium": {"name": "$1-2", "min": 1, "max": 2, "keys": []},
-                "low": {"name": "$0-1", "min": 0.01, "max": 1, "keys": []},
-                "zero": {"name": "$0", "min": -float('inf'), "max": 0.01, "keys": []}
-            }
-
-            # 按余额从高到低排序
-            successful_sorted = sorted(successful, key=lambda x: x["balance"], reverse=True)
-
-            for r in successful_sorted:
-                balance = r["balance"]
-                for cat_key, cat_info in categories.items():
-                    if cat_info["min"] <= balance < cat_info["max"]:
-                        cat_info["keys"].append(r["key"])
-                        break
-
             print(f"\n📈 余额分布:")
-            for cat_key, cat_info in categories.items():
-                count = len(cat_info["keys"])
+            for cat_key, cat_name in BALANCE_CATEGORY_NAMES.items():
+                count = len(category_keys[cat_key])
                 if count > 0:
-                    print(f"   {cat_info['name']}: {count} 个")
+                    print(f"   {cat_name}: {count} 个")
                 summary["categories"][cat_key] = count
 
             # 保存有效密钥（余额>0）到 active_keys.txt
-            active_keys = []
-            for cat_key in ["high", "medium_high", "medium", "low"]:
-                active_keys.extend(categories[cat_key]["keys"])
+            active_keys = list(itertools.chain.from_iterable(
+                category_keys[cat_key] for cat_key in ACTIVE_CATEGORY_KEYS
+            ))
 
             if active_keys:
                 active_file = KEYS_DIR / "active_keys.txt"
@@ -194,15 +248,16 @@ class VercelBillingChecker:
                 print(f"\n✅ 已保存 {len(active_keys)} 个有效密钥到: {active_file}")
 
             # 保存各分类
-            for cat_key, cat_info in categories.items():
-                if cat_info["keys"]:
+            for cat_key, cat_name in BALANCE_CATEGORY_NAMES.items():
+                keys = category_keys[cat_key]
+                if keys:
                     cat_file = KEYS_DIR / f"keys_{cat_key}.txt"
-                    cat_file.write_text('\n'.join(cat_info["keys"]))
-                    print(f"   - {cat_info['name']}: {cat_file.name} ({len(cat_info['keys'])} 个)")
+                    cat_file.write_text('\n'.join(keys))
+                    print(f"   - {cat_name}: {cat_file.name} ({len(keys)} 个)")
 
             # 显示 Top 10
             print(f"\n🏆 余额 Top 10:")
-            for i, r in enumerate(successful_sorted[:10], 1):
+            for i, r in enumerate(successful[:10], 1):
                 print(f"   {i:2d}. {r['key_short']} - ${r['balance']:.2f}")
 
         # 保存 JSON 报告
@@ -217,7 +272,7 @@ class VercelBillingChecker:
                     "total_limit": r["total_limit"],
                     "usage_percentage": r["usage_percentage"]
                 }
-                for r in sorted(successful, key=lambda x: x["balance"], reverse=True)
+                for r in successful
             ],
             "failed": [
                 {"key_short": r["key_short"], "error": r["error"]}
@@ -226,7 +281,7 @@ class VercelBillingChecker:
         }
 
         report_file = REPORTS_DIR / "billing_report.json"
-        report_file.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        report_file.write_bytes(orjson.dumps(report, option=orjson.OPT_INDENT_2))
         print(f"\n📊 详细报告: {report_file}")
 
         return summary
@@ -244,8 +299,7 @@ def main():
         sys.exit(1)
 
     # 读取密钥
-    content = keys_file.read_text()
-    api_keys = [k.strip() for k in content.split('\n') if k.strip()]
+    api_keys = load_key_file(keys_file)
 
     if not api_keys:
         print("❌ 密钥文件为空")
@@ -255,7 +309,7 @@ def main():
 
     # 执行检查
     checker = VercelBillingChecker()
-    results = checker.check_multiple_keys(api_keys, max_workers=5)
+    results = checker.check_multiple_keys(api_keys, max_workers=20)
     summary = checker.generate_report(results)
 
     print(f"\n{'='*60}")
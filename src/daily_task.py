@@ -15,6 +15,8 @@ from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
 
+from src.keyfile import load_key_file
+
 # 配置
 BASE_DIR = Path(__file__).resolve().parent.parent
 LOGS_DIR = BASE_DIR / "logs"
@@ -37,6 +39,8 @@ logging.basicConfig(
         logging.StreamHandler()
     ]
 )
+# httpx 每个请求都会输出一行 INFO 日志，只保留警告以上
+logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 
@@ -55,8 +59,7 @@ def run_refresh():
             logger.error(f"❌ 密钥文件不存在: {keys_file}")
             return False
         
-        content = keys_file.read_text()
-        api_keys = [k.strip() for k in content.split('\n') if k.strip() and not k.startswith('#')]
+        api_keys = load_key_file(keys_file)
         
         if not api_keys:
             logger.error("❌ 密钥文件为空")
@@ -89,22 +92,20 @@ def run_check():
         
         # 始终使用 total_keys.txt
         keys_file = KEYS_DIR / "total_keys.txt"
-        content = keys_file.read_text()
-        api_keys = [k.strip() for k in content.split('\n') if k.strip() and not k.startswith('#')]
+        api_keys = load_key_file(keys_file)
         
         if not api_keys:
             logger.error("❌ 密钥文件为空")
             return False
         
         checker = VercelBillingChecker()
-        results = checker.check_multiple_keys(api_keys, max_workers=10)
-        checker.generate_report(results)
+        results = checker.check_multiple_keys(api_keys, max_workers=20)
+        summary = checker.generate_report(results)
         
-        # 统计
-        successful = [r for r in results if r["status"] == "success"]
-        high_balance = len([r for r in successful if r.get("balance", 0) >= 3])
+        # 统计（直接使用报告汇总，不再重复遍历结果）
+        high_balance = summary["categories"].get("high", 0)
         
-        logger.info(f"✅ 检查完成: {len(successful)}/{len(api_keys)} 个有效")
+        logger.info(f"✅ 检查完成: {summary['successful']}/{len(api_keys)} 个有效")
         logger.info(f"   高余额密钥($3+): {high_balance} 个")
         
         return True
@@ -192,7 +193,7 @@ def main():
     # 显示当前密钥状态
     keys_high = KEYS_DIR / "keys_high.txt"
     if keys_high.exists():
-        count = len([k for k in keys_high.read_text().split('\n') if k.strip()])
+        count = sum(1 for line in keys_high.read_text().splitlines() if line.strip())
         logger.info(f"\n📊 当前高余额密钥: {count} 个")
         logger.info(f"   文件: {keys_high}")
 
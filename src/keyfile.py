@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+密钥文件读取
+代理服务、daily_task、billing_checker、key_refresher 共用
+"""
+
+from pathlib import Path
+from typing import List, Union
+
+
+def load_key_file(path: Union[str, Path]) -> List[str]:
+    """
+    读取密钥文件，每行一个密钥，忽略空行和 # 开头的注释
+
+    按字节切分和过滤，只对保留下来的密钥解码。
+    文件不存在时抛出 FileNotFoundError，由调用方处理。
+    """
+    content = Path(path).read_bytes()
+    return [
+        key.decode() for key in (line.strip() for line in content.splitlines())
+        if key and not key.startswith(b'#')
+    ]
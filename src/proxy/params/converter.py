@@ -5,8 +5,12 @@
 处理 Cherry Studio 发送的请求参数并转换为 Vercel AI Gateway 格式
 """
 
-import copy
-from typing import Dict, Any, Optional, Tuple
+import re
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Any, FrozenSet, Mapping, Optional, Tuple
+
+import orjson
 
 from .models import (
     ProviderType,
@@ -14,6 +18,7 @@ from .models import (
     get_model_info,
     SUPPORTED_MODELS,
     MODEL_ALIASES,
+    MODEL_SHORT_NAMES,
 )
 from .reasoning import (
     ReasoningParams,
@@ -22,13 +27,145 @@ from .reasoning import (
 )
 
 
+# 无 provider 前缀的模型名 -> 需要补全的前缀（按顺序匹配）
+_MODEL_PREFIX_PROVIDERS: Tuple[Tuple[str, str], ...] = (
+    ("claude", "anthropic"),
+    ("gpt", "openai"),
+    ("o1", "openai"),
+    ("o3", "openai"),
+    ("o4", "openai"),
+    ("gemini", "google"),
+    ("grok", "xai"),
+    ("deepseek", "deepseek"),
+)
+
+# 由上表生成的前缀正则，一次 match 代替逐个 startswith
+_MODEL_PREFIX_RE = re.compile("|".join(re.escape(prefix) for prefix, _ in _MODEL_PREFIX_PROVIDERS))
+_MODEL_PREFIX_TO_PROVIDER: Mapping[str, str] = MappingProxyType(dict(_MODEL_PREFIX_PROVIDERS))
+
+
+# Provider -> providerOptions 中可能使用的命名空间（按优先级）
+_PROVIDER_OPTION_KEYS: Mapping[ProviderType, Tuple[str, ...]] = MappingProxyType({
+    ProviderType.ANTHROPIC: ("anthropic", "claude"),
+    ProviderType.OPENAI: ("openai", "azure"),
+    ProviderType.GOOGLE: ("google", "gemini"),
+    ProviderType.XAI: ("xai", "grok"),
+    ProviderType.DEEPSEEK: ("deepseek",),
+    ProviderType.QWEN: ("qwen", "alibaba"),
+    ProviderType.DOUBAO: ("doubao", "bytedance"),
+    ProviderType.OPENROUTER: ("openrouter",),
+    ProviderType.BEDROCK: ("bedrock", "aws"),
+})
+
+# 参数名 -> (标准参数名, 优先级)，同一参数有多种写法时优先级数值小的生效
+_PARAM_ALIASES: Dict[str, Tuple[str, int]] = {
+    "max_tokens": ("max_tokens", 0),
+    "maxTokens": ("max_tokens", 1),
+    "max_output_tokens": ("max_tokens", 2),
+    "maxOutputTokens": ("max_tokens", 3),
+    "top_p": ("top_p", 0),
+    "topP": ("top_p", 1),
+    "top_k": ("top_k", 0),
+    "topK": ("top_k", 1),
+    "frequency_penalty": ("frequency_penalty", 0),
+    "frequencyPenalty": ("frequency_penalty", 1),
+    "presence_penalty": ("presence_penalty", 0),
+    "presencePenalty": ("presence_penalty", 1),
+    "stop": ("stop", 0),
+    "stopSequences": ("stop", 1),
+}
+
+
+def _collect_aliased_params(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    一次遍历请求体，按标准参数名收集带别名的参数（值为 None 视为未设置）
+    
+    Returns:
+        标准参数名 -> 原始值（未做类型转换）
+    """
+    params: Dict[str, Any] = {}
+    ranks: Dict[str, int] = {}
+    for key, value in body.items():
+        alias = _PARAM_ALIASES.get(key)
+        if alias is None or value is None:
+            continue
+        canonical, rank = alias
+        if rank < ranks.get(canonical, len(_PARAM_ALIASES)):
+            params[canonical] = value
+            ranks[canonical] = rank
+    return params
+
+
+# 出现这些字段时请求体一定需要转换
+_CONVERSION_TRIGGER_KEYS: FrozenSet[str] = frozenset(
+    [key for key, (canonical, _) in _PARAM_ALIASES.items() if key != canonical] + [
+        "providerOptions",
+        "customParameters",
+        "reasoning_effort",
+        "enable_thinking",
+        "thinking",
+        "thinking_budget",
+    ]
+)
+
+
+# convert 会转成 int 的参数
+_INT_PARAMS: Tuple[str, ...] = ("max_tokens", "top_k", "seed")
+# convert 会转成 float 的参数
+_NUMBER_PARAMS: Tuple[str, ...] = ("temperature", "top_p", "frequency_penalty", "presence_penalty")
+
+
+@lru_cache(maxsize=1024)
+def _normalize_model_id(model_id: str) -> str:
+    """
+    标准化模型 ID（带缓存）
+
+    SUPPORTED_MODELS / MODEL_ALIASES 在导入后不再变化，同一模型 ID 只需计算一次。
+    """
+    if not model_id:
+        return model_id
+    
+    # 检查别名
+    if model_id in MODEL_ALIASES:
+        return MODEL_ALIASES[model_id]
+    
+    # 检查是否已经是完整格式
+    if model_id in SUPPORTED_MODELS:
+        return model_id
+    
+    # 尝试添加 provider 前缀
+    provider = detect_provider(model_id)
+    if provider is not ProviderType.UNKNOWN and not "/" in model_id:
+        full_id = f"{provider.value}/{model_id}"
+        if full_id in SUPPORTED_MODELS:
+            return full_id
+    
+    # 不带前缀的完整模型名
+    full_id = MODEL_SHORT_NAMES.get(model_id)
+    if full_id:
+        return full_id
+    
+    # 尝试模糊匹配
+    for key in SUPPORTED_MODELS.keys():
+        if model_id in key:
+            return key
+    
+    # 如果没有前缀，尝试添加
+    if "/" not in model_id:
+        match = _MODEL_PREFIX_RE.match(model_id)
+        if match:
+            return f"{_MODEL_PREFIX_TO_PROVIDER[match.group()]}/{model_id}"
+    
+    return model_id
+
+
 class ParamsConverter:
     """
     参数转换器
     负责将 Cherry Studio 格式的请求参数转换为 Vercel AI Gateway 格式
     """
     
-    def __init__(self):
+    def __init__(self) -> None:
         pass
     
     def normalize_model_id(self, model_id: str) -> str:
@@ -40,43 +177,7 @@ class ParamsConverter:
             - "gpt-4o" -> "openai/gpt-4o"
             - "anthropic/claude-3-5-sonnet" -> "anthropic/claude-3-5-sonnet-20241022"
         """
-        if not model_id:
-            return model_id
-        
-        # 检查别名
-        if model_id in MODEL_ALIASES:
-            return MODEL_ALIASES[model_id]
-        
-        # 检查是否已经是完整格式
-        if model_id in SUPPORTED_MODELS:
-            return model_id
-        
-        # 尝试添加 provider 前缀
-        provider = detect_provider(model_id)
-        if provider != ProviderType.UNKNOWN and not "/" in model_id:
-            full_id = f"{provider.value}/{model_id}"
-            if full_id in SUPPORTED_MODELS:
-                return full_id
-        
-        # 尝试模糊匹配
-        for key in SUPPORTED_MODELS.keys():
-            if model_id in key or key.endswith(f"/{model_id}"):
-                return key
-        
-        # 如果没有前缀，尝试添加
-        if "/" not in model_id:
-            if model_id.startswith("claude"):
-                return f"anthropic/{model_id}"
-            if model_id.startswith("gpt") or model_id.startswith("o1") or model_id.startswith("o3") or model_id.startswith("o4"):
-                return f"openai/{model_id}"
-            if model_id.startswith("gemini"):
-                return f"google/{model_id}"
-            if model_id.startswith("grok"):
-                return f"xai/{model_id}"
-            if model_id.startswith("deepseek"):
-                return f"deepseek/{model_id}"
-        
-        return model_id
+        return _normalize_model_id(model_id)
     
     def extract_provider_options(self, body: Dict[str, Any], provider: ProviderType) -> Dict[str, Any]:
         """
@@ -94,20 +195,7 @@ class ParamsConverter:
         provider_options = body.get("providerOptions", {})
         
         # 根据 provider 类型选择对应的选项
-        provider_key_map = {
-            ProviderType.ANTHROPIC: ["anthropic", "claude"],
-            ProviderType.OPENAI: ["openai", "azure"],
-            ProviderType.GOOGLE: ["google", "gemini"],
-            ProviderType.XAI: ["xai", "grok"],
-            ProviderType.DEEPSEEK: ["deepseek"],
-            ProviderType.QWEN: ["qwen", "alibaba"],
-            ProviderType.DOUBAO: ["doubao", "bytedance"],
-            ProviderType.OPENROUTER: ["openrouter"],
-            ProviderType.BEDROCK: ["bedrock", "aws"],
-        }
-        
-        keys = provider_key_map.get(provider, [])
-        for key in keys:
+        for key in _PROVIDER_OPTION_KEYS.get(provider, ()):
             if key in provider_options:
                 return provider_options[key]
         
@@ -123,11 +211,15 @@ class ParamsConverter:
         if temp is None:
             return None
         
+        # JSON 解析出的小数已是 float，无需再转换
+        if type(temp) is not float:
+            temp = float(temp)
+        
         # Claude 模型温度上限为 1
-        if provider == ProviderType.ANTHROPIC:
-            return min(float(temp), 1.0)
+        if temp > 1.0 and provider is ProviderType.ANTHROPIC:
+            return 1.0
         
-        return float(temp)
+        return temp
     
     def convert_max_tokens(self, body: Dict[str, Any], model_id: str) -> Optional[int]:
         """
@@ -140,12 +232,7 @@ class ParamsConverter:
         - maxOutputTokens
         """
         # 尝试多种参数名
-        max_tokens = (
-            body.get("max_tokens") or
-            body.get("maxTokens") or
-            body.get("max_output_tokens") or
-            body.get("maxOutputTokens")
-        )
+        max_tokens = _collect_aliased_params(body).get("max_tokens")
         
         if max_tokens is None:
             # 使用模型默认值
@@ -168,31 +255,28 @@ class ParamsConverter:
         - stop / stopSequences
         - seed
         """
-        result = {}
+        result: Dict[str, Any] = {}
+        params = _collect_aliased_params(body)
         
         # Top P
-        top_p = body.get("top_p") or body.get("topP")
-        if top_p is not None:
-            result["top_p"] = float(top_p)
+        if "top_p" in params:
+            result["top_p"] = float(params["top_p"])
         
         # Top K
-        top_k = body.get("top_k") or body.get("topK")
-        if top_k is not None:
-            result["top_k"] = int(top_k)
+        if "top_k" in params:
+            result["top_k"] = int(params["top_k"])
         
         # Frequency Penalty
-        freq_penalty = body.get("frequency_penalty") or body.get("frequencyPenalty")
-        if freq_penalty is not None:
-            result["frequency_penalty"] = float(freq_penalty)
+        if "frequency_penalty" in params:
+            result["frequency_penalty"] = float(params["frequency_penalty"])
         
         # Presence Penalty
-        pres_penalty = body.get("presence_penalty") or body.get("presencePenalty")
-        if pres_penalty is not None:
-            result["presence_penalty"] = float(pres_penalty)
+        if "presence_penalty" in params:
+            result["presence_penalty"] = float(params["presence_penalty"])
         
         # Stop Sequences
-        stop = body.get("stop") or body.get("stopSequences")
-        if stop is not None:
+        if "stop" in params:
+            stop = params["stop"]
             result["stop"] = stop if isinstance(stop, list) else [stop]
         
         # Seed
@@ -215,7 +299,7 @@ class ParamsConverter:
         }
         """
         custom_params = body.get("customParameters", [])
-        result = {}
+        result: Dict[str, Any] = {}
         
         for param in custom_params:
             name = param.get("name", "").strip()
@@ -231,8 +315,7 @@ class ParamsConverter:
                     if value == "undefined":
                         continue
                     try:
-                        import json
-                        value = json.loads(value)
+                        value = orjson.loads(value)
                     except:
                         pass
             elif param_type == "number":
@@ -260,7 +343,7 @@ class ParamsConverter:
         
         这是核心转换函数，根据 Provider 类型构建不同格式的选项
         """
-        result = {}
+        result: Dict[str, Any] = {}
         
         # 1. 提取原有的 provider 选项
         existing_options = self.extract_provider_options(body, provider)
@@ -273,11 +356,11 @@ class ParamsConverter:
         # 3. 合并推理参数
         if reasoning_params:
             # 对于某些 provider，参数需要放在特定位置
-            if provider == ProviderType.ANTHROPIC:
+            if provider is ProviderType.ANTHROPIC:
                 result.update(reasoning_params)
-            elif provider == ProviderType.OPENAI:
+            elif provider is ProviderType.OPENAI:
                 result.update(reasoning_params)
-            elif provider == ProviderType.GOOGLE:
+            elif provider is ProviderType.GOOGLE:
                 result.update(reasoning_params)
             else:
                 result.update(reasoning_params)
@@ -300,9 +383,18 @@ class ParamsConverter:
         
         Returns:
             (转换后的请求体, 检测到的 Provider 类型)
+        
+        注意:
+            返回结果中的 messages 与 body["messages"] 是同一个列表（不做拷贝），
+            转换前后都不要原地修改 messages，需要修改时由调用方自行复制
         """
+        result: Dict[str, Any]
         if preserve_original:
-            result = copy.deepcopy(body)
+            # 只修改顶层键，浅拷贝即可；providerOptions 会被写入，单独复制一层
+            # 注意: messages 等嵌套结构与原始请求体共享引用
+            result = dict(body)
+            if isinstance(result.get("providerOptions"), dict):
+                result["providerOptions"] = dict(result["providerOptions"])
         else:
             result = {}
         
@@ -315,6 +407,7 @@ class ParamsConverter:
         provider = detect_provider(normalized_model)
         
         # 3. 复制必要的基础参数
+        # messages 直接引用原列表，只读使用
         result["messages"] = body.get("messages", [])
         result["stream"] = body.get("stream", False)
         
@@ -356,6 +449,48 @@ class ParamsConverter:
         
         return result, provider
     
+    def is_already_normalized(self, body: Dict[str, Any]) -> bool:
+        """
+        判断请求体是否已是 Vercel AI Gateway 格式
+        
+        满足以下条件时 convert 不会产生任何改动，可跳过转换:
+        - 模型 ID 已是完整格式
+        - 没有参数别名、providerOptions、推理参数和自定义参数
+        - 已显式给出 messages / stream / max_tokens
+        - stop 为列表，Claude 模型的 temperature 不超过 1
+        - 数值参数类型正确: max_tokens / top_k / seed 为 int，
+          temperature / top_p / frequency_penalty / presence_penalty 为 int 或 float
+        """
+        model_id = body.get("model")
+        if model_id not in SUPPORTED_MODELS:
+            return False
+        
+        if not _CONVERSION_TRIGGER_KEYS.isdisjoint(body):
+            return False
+        
+        if "messages" not in body or "stream" not in body or body.get("max_tokens") is None:
+            return False
+        
+        stop = body.get("stop")
+        if stop is not None and not isinstance(stop, list):
+            return False
+        
+        # 类型不符的数值参数交给 convert 转换（bool 不算数值）
+        for key in _INT_PARAMS:
+            value = body.get(key)
+            if value is not None and type(value) is not int:
+                return False
+        for key in _NUMBER_PARAMS:
+            value = body.get(key)
+            if value is not None and type(value) not in (int, float):
+                return False
+        
+        temperature = body.get("temperature")
+        if temperature is not None and detect_provider(model_id) is ProviderType.ANTHROPIC:
+            return temperature <= 1
+        
+        return True
+    
     def convert_for_vercel_gateway(
         self,
         body: Dict[str, Any]
@@ -364,7 +499,11 @@ class ParamsConverter:
         专门为 Vercel AI Gateway 转换请求
         
         Vercel AI Gateway 需要特定的格式，这个函数处理所有必要的转换
+        请求体已是标准格式时直接返回原对象（不复制）
         """
+        if self.is_already_normalized(body):
+            return body
+        
         converted, provider = self.convert(body, preserve_original=True)
         
         # Vercel AI Gateway 特殊处理
@@ -379,13 +518,13 @@ class ParamsConverter:
             opts = provider_options[provider_key]
             
             # 对于 Anthropic，thinking 参数需要在顶层
-            if provider == ProviderType.ANTHROPIC and "thinking" in opts:
+            if provider is ProviderType.ANTHROPIC and "thinking" in opts:
                 # Vercel AI Gateway 可能期望 thinking 在顶层
                 # 保持在 providerOptions 中，让 Gateway 自己处理
                 pass
             
             # 对于 OpenAI，reasoningEffort 需要在顶层
-            if provider == ProviderType.OPENAI and "reasoningEffort" in opts:
+            if provider is ProviderType.OPENAI and "reasoningEffort" in opts:
                 # 同样保持在 providerOptions 中
                 pass
         
@@ -5,9 +5,17 @@
 包含支持的模型列表、Token 限制、能力配置等
 """
 
-from typing import Dict, List, Optional, Any
+import re
+import sys
+from typing import Dict, List, Mapping, Optional, Any
 from dataclasses import dataclass, field
 from enum import Enum
+from functools import lru_cache
+from types import MappingProxyType
+
+
+# Python 3.10+ 的 dataclass 支持 slots，去掉实例 __dict__（低版本自动忽略）
+DATACLASS_SLOTS: Dict[str, bool] = {"slots": True} if sys.version_info >= (3, 10) else {}
 
 
 class ProviderType(str, Enum):
@@ -25,7 +33,7 @@ class ProviderType(str, Enum):
     UNKNOWN = "unknown"
 
 
-@dataclass
+@dataclass(frozen=True, **DATACLASS_SLOTS)
 class TokenLimit:
     """Token 限制配置"""
     min_tokens: int = 1024
@@ -33,7 +41,7 @@ class TokenLimit:
     default_tokens: int = 4096
 
 
-@dataclass
+@dataclass(frozen=True, **DATACLASS_SLOTS)
 class ModelCapabilities:
     """模型能力配置"""
     supports_thinking: bool = False
@@ -44,7 +52,7 @@ class ModelCapabilities:
     supports_web_search: bool = False
 
 
-@dataclass
+@dataclass(frozen=True, **DATACLASS_SLOTS)
 class ModelConfig:
     """模型配置"""
     id: str
@@ -91,7 +99,8 @@ class ModelConfig:
 # 支持的模型列表
 # ================================
 
-SUPPORTED_MODELS: Dict[str, ModelConfig] = {
+# 模型表在导入后只读，下面的查找表和缓存都依赖这一点
+SUPPORTED_MODELS: Mapping[str, ModelConfig] = MappingProxyType({
     # ================================
     # Anthropic / Claude 模型
     # ================================
@@ -419,10 +428,10 @@ SUPPORTED_MODELS: Dict[str, ModelConfig] = {
         description="DeepSeek Chat - 通用对话模型",
         context_window=128000,
     ),
-}
+})
 
 # 模型别名映射
-MODEL_ALIASES: Dict[str, str] = {
+MODEL_ALIASES: Mapping[str, str] = MappingProxyType({
     # Claude 别名
     "claude-sonnet-4": "anthropic/claude-sonnet-4-20250514",
     "claude-4-sonnet": "anthropic/claude-sonnet-4-20250514",
@@ -458,61 +467,127 @@ MODEL_ALIASES: Dict[str, str] = {
     # DeepSeek 别名
     "deepseek-r1": "deepseek/deepseek-r1",
     "deepseek-chat": "deepseek/deepseek-chat",
-}
+})
+
+# 不带 provider 前缀的模型名 -> 完整模型 ID
+# 例如: "claude-3-5-sonnet-20241022" -> "anthropic/claude-3-5-sonnet-20241022"
+MODEL_SHORT_NAMES: Mapping[str, str] = MappingProxyType({
+    key.split("/", 1)[1]: key
+    for key in SUPPORTED_MODELS
+    if "/" in key
+})
 
 
+# 合并后的精确查找表，优先级: 完整 ID > 别名 > 不带前缀的模型名
+# 三者都直接指向同一个 ModelConfig，一次查询即可命中
+_MODEL_LOOKUP: Mapping[str, ModelConfig] = MappingProxyType({
+    **{
+        short_name: SUPPORTED_MODELS[full_id]
+        for short_name, full_id in MODEL_SHORT_NAMES.items()
+    },
+    **{
+        alias: SUPPORTED_MODELS[target]
+        for alias, target in MODEL_ALIASES.items()
+        if target in SUPPORTED_MODELS
+    },
+    **SUPPORTED_MODELS,
+})
+
+
+@lru_cache(maxsize=512)
 def get_model_info(model_id: str) -> Optional[ModelConfig]:
-    """获取模型配置信息"""
-    # 直接匹配
-    if model_id in SUPPORTED_MODELS:
-        return SUPPORTED_MODELS[model_id]
-    
-    # 别名匹配
-    if model_id in MODEL_ALIASES:
-        return SUPPORTED_MODELS.get(MODEL_ALIASES[model_id])
+    """获取模型配置信息（结果会被缓存，调用方不要修改返回的配置）"""
+    # 完整 ID / 别名 / 不带前缀的模型名
+    config = _MODEL_LOOKUP.get(model_id)
+    if config is not None:
+        return config
     
-    # 模糊匹配（不带 provider 前缀）
+    # 模糊匹配（模型 ID 的一部分）
     for key, config in SUPPORTED_MODELS.items():
-        if key.endswith(f"/{model_id}") or model_id in key:
+        if model_id in key:
             return config
     
     return None
 
 
+# Provider 检测优先级：同时命中多个规则时，取排在前面的 Provider
+_PROVIDER_PRIORITY: Dict[ProviderType, int] = {
+    provider: rank
+    for rank, provider in enumerate((
+        ProviderType.ANTHROPIC,
+        ProviderType.OPENAI,
+        ProviderType.GOOGLE,
+        ProviderType.XAI,
+        ProviderType.DEEPSEEK,
+        ProviderType.QWEN,
+        ProviderType.DOUBAO,
+        ProviderType.OPENROUTER,
+    ))
+}
+
+# "provider/model" 格式的前缀 -> Provider
+_PROVIDER_ID_PREFIXES: Dict[str, ProviderType] = {
+    "anthropic": ProviderType.ANTHROPIC,
+    "openai": ProviderType.OPENAI,
+    "google": ProviderType.GOOGLE,
+    "xai": ProviderType.XAI,
+    "deepseek": ProviderType.DEEPSEEK,
+    "qwen": ProviderType.QWEN,
+    "doubao": ProviderType.DOUBAO,
+    "openrouter": ProviderType.OPENROUTER,
+}
+
+# 模型 ID 中任意位置出现的关键词 -> Provider
+_PROVIDER_KEYWORDS: Dict[str, ProviderType] = {
+    "claude": ProviderType.ANTHROPIC,
+    "gemini": ProviderType.GOOGLE,
+    "grok": ProviderType.XAI,
+    "deepseek": ProviderType.DEEPSEEK,
+    "qwen": ProviderType.QWEN,
+    "qwq": ProviderType.QWEN,
+    "doubao": ProviderType.DOUBAO,
+}
+_PROVIDER_KEYWORD_RE = re.compile("|".join(_PROVIDER_KEYWORDS))
+
+# 不带前缀的 OpenAI 模型名开头
+_OPENAI_NAME_RE = re.compile(r"gpt|o[134]")
+
+
+@lru_cache(maxsize=512)
 def detect_provider(model_id: str) -> ProviderType:
-    """根据模型 ID 检测 Provider 类型"""
+    """根据模型 ID 检测 Provider 类型（结果会被缓存）"""
     model_lower = model_id.lower()
     
+    # 关键词一次扫描
+    candidates = {_PROVIDER_KEYWORDS[word] for word in _PROVIDER_KEYWORD_RE.findall(model_lower)}
+    
     # 检查前缀
-    if model_lower.startswith("anthropic/") or "claude" in model_lower:
-        return ProviderType.ANTHROPIC
-    if model_lower.startswith("openai/") or model_lower.startswith("gpt") or model_lower.startswith("o1") or model_lower.startswith("o3") or model_lower.startswith("o4"):
-        return ProviderType.OPENAI
-    if model_lower.startswith("google/") or "gemini" in model_lower:
-        return ProviderType.GOOGLE
-    if model_lower.startswith("xai/") or "grok" in model_lower:
-        return ProviderType.XAI
-    if model_lower.startswith("deepseek/") or "deepseek" in model_lower:
-        return ProviderType.DEEPSEEK
-    if model_lower.startswith("qwen/") or "qwen" in model_lower or "qwq" in model_lower:
-        return ProviderType.QWEN
-    if model_lower.startswith("doubao/") or "doubao" in model_lower:
-        return ProviderType.DOUBAO
-    if model_lower.startswith("openrouter/"):
-        return ProviderType.OPENROUTER
+    prefix, sep, _ = model_lower.partition("/")
+    if sep and prefix in _PROVIDER_ID_PREFIXES:
+        candidates.add(_PROVIDER_ID_PREFIXES[prefix])
+    if _OPENAI_NAME_RE.match(model_lower):
+        candidates.add(ProviderType.OPENAI)
     
-    return ProviderType.UNKNOWN
+    if not candidates:
+        return ProviderType.UNKNOWN
+    return min(candidates, key=_PROVIDER_PRIORITY.__getitem__)
+
+
+# OpenAI 格式的模型列表在导入时生成一次（模型表运行期间不变）
+_ALL_MODELS_OPENAI: List[Dict[str, Any]] = []
+_MODELS_BY_PROVIDER: Dict[ProviderType, List[Dict[str, Any]]] = {}
+for _config in SUPPORTED_MODELS.values():
+    _model = _config.to_openai_format()
+    _ALL_MODELS_OPENAI.append(_model)
+    _MODELS_BY_PROVIDER.setdefault(_config.provider, []).append(_model)
+del _config, _model
 
 
 def get_all_models() -> List[Dict[str, Any]]:
-    """获取所有支持的模型列表（OpenAI 格式）"""
-    return [config.to_openai_format() for config in SUPPORTED_MODELS.values()]
+    """获取所有支持的模型列表（OpenAI 格式，列表内的字典为共享数据，不要修改）"""
+    return list(_ALL_MODELS_OPENAI)
 
 
 def get_models_by_provider(provider: ProviderType) -> List[Dict[str, Any]]:
-    """获取指定 Provider 的模型列表"""
-    return [
-        config.to_openai_format()
-        for config in SUPPORTED_MODELS.values()
-        if config.provider == provider
-    ]
+    """获取指定 Provider 的模型列表（列表内的字典为共享数据，不要修改）"""
+    return list(_MODELS_BY_PROVIDER.get(provider, ()))
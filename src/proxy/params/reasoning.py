@@ -5,11 +5,20 @@
 处理不同 Provider 的思考强度参数转换
 """
 
-from typing import Dict, Any, Optional, Literal
+from typing import Callable, Dict, Any, Mapping, Optional, Literal, Tuple
 from dataclasses import dataclass
 from enum import Enum
+from functools import lru_cache
+from types import MappingProxyType
 
-from .models import ProviderType, get_model_info, detect_provider
+from .models import (
+    ProviderType,
+    get_model_info,
+    detect_provider,
+    SUPPORTED_MODELS,
+    MODEL_ALIASES,
+    DATACLASS_SLOTS,
+)
 
 
 class ReasoningEffort(str, Enum):
@@ -33,17 +42,54 @@ EFFORT_RATIO: Dict[str, float] = {
 }
 
 
-@dataclass
+# 字符串 -> ReasoningEffort，请求中的思考强度在解析时统一转换一次
+_EFFORT_BY_VALUE: Mapping[str, ReasoningEffort] = MappingProxyType(
+    {effort.value: effort for effort in ReasoningEffort}
+)
+
+# OpenAI / OpenRouter 只支持 low, medium, high
+_OPENAI_EFFORT_MAP: Mapping[str, str] = MappingProxyType({
+    ReasoningEffort.MINIMAL: "low",
+    ReasoningEffort.LOW: "low",
+    ReasoningEffort.MEDIUM: "medium",
+    ReasoningEffort.HIGH: "high",
+    ReasoningEffort.XHIGH: "high",
+    ReasoningEffort.AUTO: "medium",
+})
+
+# Grok 只支持 low 和 high
+_XAI_EFFORT_MAP: Mapping[str, str] = MappingProxyType({
+    ReasoningEffort.MINIMAL: "low",
+    ReasoningEffort.LOW: "low",
+    ReasoningEffort.MEDIUM: "low",
+    ReasoningEffort.HIGH: "high",
+    ReasoningEffort.XHIGH: "high",
+    ReasoningEffort.AUTO: "low",
+})
+
+# 共用的只读空字典（未开启推理时的返回值、缺失的 providerOptions 子项）
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
+
+
+@dataclass(frozen=True, **DATACLASS_SLOTS)
 class ReasoningParams:
     """推理参数"""
     enabled: bool = False
-    effort: str = "medium"
+    effort: ReasoningEffort = ReasoningEffort.MEDIUM
     budget_tokens: Optional[int] = None
     include_thoughts: bool = True
 
 
+def normalize_effort(effort: Any) -> ReasoningEffort:
+    """将请求中的思考强度转换为 ReasoningEffort，无法识别的值按 medium 处理"""
+    if isinstance(effort, str):
+        return _EFFORT_BY_VALUE.get(effort, ReasoningEffort.MEDIUM)
+    return ReasoningEffort.MEDIUM
+
+
+@lru_cache(maxsize=256)
 def calculate_budget_tokens(
-    effort: str,
+    effort: ReasoningEffort,
     min_tokens: int = 1024,
     max_tokens: int = 16384,
     output_max_tokens: Optional[int] = None
@@ -51,6 +97,8 @@ def calculate_budget_tokens(
     """
     计算思考 Token 预算
     
+    参数组合有限（思考强度 × 模型 Token 限制），结果会被缓存
+    
     Args:
         effort: 思考强度级别
         min_tokens: 最小 Token 数
@@ -74,6 +122,31 @@ def calculate_budget_tokens(
     return budget
 
 
+# 模型 ID / 别名 -> (min_tokens, max_tokens)，导入时生成
+_MODEL_TOKEN_RANGE: Dict[str, Tuple[int, int]] = {
+    model_id: (config.token_limit.min_tokens, config.token_limit.max_tokens)
+    for model_id, config in SUPPORTED_MODELS.items()
+}
+_MODEL_TOKEN_RANGE.update({
+    alias: _MODEL_TOKEN_RANGE[target]
+    for alias, target in MODEL_ALIASES.items()
+    if target in _MODEL_TOKEN_RANGE
+})
+
+
+def _model_token_range(model_id: str, default_max_tokens: int) -> Tuple[int, int]:
+    """获取模型的思考 Token 范围，未知模型使用 (1024, default_max_tokens)"""
+    token_range = _MODEL_TOKEN_RANGE.get(model_id)
+    if token_range is not None:
+        return token_range
+    
+    # 不在表中的写法（如不带前缀的模型名）走模糊匹配
+    model_info = get_model_info(model_id)
+    if model_info:
+        return model_info.token_limit.min_tokens, model_info.token_limit.max_tokens
+    return 1024, default_max_tokens
+
+
 def get_anthropic_reasoning_params(
     reasoning: ReasoningParams,
     model_id: str
@@ -89,17 +162,8 @@ def get_anthropic_reasoning_params(
         }
     }
     """
-    if not reasoning.enabled:
-        return {}
-    
     # 获取模型的 Token 限制
-    model_info = get_model_info(model_id)
-    if model_info:
-        min_tokens = model_info.token_limit.min_tokens
-        max_tokens = model_info.token_limit.max_tokens
-    else:
-        min_tokens = 1024
-        max_tokens = 16384
+    min_tokens, max_tokens = _model_token_range(model_id, 16384)
     
     budget = reasoning.budget_tokens or calculate_budget_tokens(
         reasoning.effort, min_tokens, max_tokens
@@ -126,20 +190,7 @@ def get_openai_reasoning_params(
         "reasoningSummary": "auto" | "concise" | "detailed"  # 可选
     }
     """
-    if not reasoning.enabled:
-        return {}
-    
-    # OpenAI 只支持 low, medium, high
-    effort_map = {
-        "minimal": "low",
-        "low": "low",
-        "medium": "medium",
-        "high": "high",
-        "xhigh": "high",
-        "auto": "medium",
-    }
-    
-    effort = effort_map.get(reasoning.effort, "medium")
+    effort = _OPENAI_EFFORT_MAP.get(reasoning.effort, "medium")
     
     result = {
         "reasoningEffort": effort
@@ -168,34 +219,22 @@ def get_gemini_reasoning_params(
         }
     }
     """
-    if not reasoning.enabled:
-        return {}
-    
-    # 获取模型的 Token 限制
-    model_info = get_model_info(model_id)
-    if model_info:
-        min_tokens = model_info.token_limit.min_tokens
-        max_tokens = model_info.token_limit.max_tokens
+    # 如果是 auto，使用 -1（无需计算预算）
+    if reasoning.effort == "auto":
+        budget = -1
     else:
-        min_tokens = 1024
-        max_tokens = 65536
-    
-    budget = reasoning.budget_tokens or calculate_budget_tokens(
-        reasoning.effort, min_tokens, max_tokens
-    )
+        # 获取模型的 Token 限制
+        min_tokens, max_tokens = _model_token_range(model_id, 65536)
+        budget = reasoning.budget_tokens or calculate_budget_tokens(
+            reasoning.effort, min_tokens, max_tokens
+        )
     
-    result = {
+    return {
         "thinkingConfig": {
             "thinkingBudget": budget,
             "includeThoughts": reasoning.include_thoughts,
         }
     }
-    
-    # 如果是 auto，使用 -1
-    if reasoning.effort == "auto":
-        result["thinkingConfig"]["thinkingBudget"] = -1
-    
-    return result
 
 
 def get_xai_reasoning_params(
@@ -210,17 +249,19 @@ def get_xai_reasoning_params(
         "reasoningEffort": "low" | "high"
     }
     """
-    if not reasoning.enabled:
-        return {}
-    
-    # Grok 只支持 low 和 high
-    effort = "high" if reasoning.effort in ("high", "xhigh") else "low"
+    effort = _XAI_EFFORT_MAP.get(reasoning.effort, "low")
     
     return {
         "reasoningEffort": effort
     }
 
 
+@lru_cache(maxsize=128)
+def _is_deepseek_r1(model_id: str) -> bool:
+    """是否为 DeepSeek R1 系列（按模型 ID 缓存，避免每次请求都转小写）"""
+    return "r1" in model_id.lower()
+
+
 def get_deepseek_reasoning_params(
     reasoning: ReasoningParams,
     model_id: str
@@ -240,11 +281,8 @@ def get_deepseek_reasoning_params(
         "thinking_budget": number
     }
     """
-    if not reasoning.enabled:
-        return {}
-    
     # DeepSeek R1 使用 thinking 格式
-    if "r1" in model_id.lower():
+    if _is_deepseek_r1(model_id):
         return {
             "thinking": {
                 "type": "enabled"
@@ -275,9 +313,6 @@ def get_qwen_reasoning_params(
         "thinking_budget": number
     }
     """
-    if not reasoning.enabled:
-        return {}
-    
     result = {
         "enable_thinking": True
     }
@@ -312,31 +347,43 @@ def get_openrouter_reasoning_params(
         }
     }
     """
-    if not reasoning.enabled:
-        return {}
-    
     # 尝试使用 effort
-    effort_map = {
-        "minimal": "low",
-        "low": "low",
-        "medium": "medium",
-        "high": "high",
-        "xhigh": "high",
-        "auto": "medium",
-    }
-    
     return {
         "reasoning": {
-            "effort": effort_map.get(reasoning.effort, "medium")
+            "effort": _OPENAI_EFFORT_MAP.get(reasoning.effort, "medium")
         }
     }
 
 
+# Provider -> 推理参数处理函数（未列出的 Provider 默认使用 OpenAI 格式）
+# 处理函数不再检查 reasoning.enabled，由 get_reasoning_params 统一判断
+_REASONING_HANDLERS: Mapping[ProviderType, Callable[[ReasoningParams, str], Dict[str, Any]]] = MappingProxyType({
+    ProviderType.ANTHROPIC: get_anthropic_reasoning_params,
+    ProviderType.OPENAI: get_openai_reasoning_params,
+    ProviderType.GOOGLE: get_gemini_reasoning_params,
+    ProviderType.XAI: get_xai_reasoning_params,
+    ProviderType.DEEPSEEK: get_deepseek_reasoning_params,
+    ProviderType.QWEN: get_qwen_reasoning_params,
+    ProviderType.OPENROUTER: get_openrouter_reasoning_params,
+})
+
+
+@lru_cache(maxsize=256)
+def _cached_reasoning_params(
+    provider: ProviderType,
+    reasoning: ReasoningParams,
+    model_id: str
+) -> Mapping[str, Any]:
+    """按 (Provider, 推理参数, 模型) 缓存处理函数的输出"""
+    handler = _REASONING_HANDLERS.get(provider, get_openai_reasoning_params)
+    return MappingProxyType(handler(reasoning, model_id))
+
+
 def get_reasoning_params(
     provider: ProviderType,
     reasoning: ReasoningParams,
     model_id: str
-) -> Dict[str, Any]:
+) -> Mapping[str, Any]:
     """
     获取指定 Provider 的推理参数
     
@@ -346,27 +393,28 @@ def get_reasoning_params(
         model_id: 模型 ID
     
     Returns:
-        转换后的推理参数字典
+        转换后的推理参数字典（只读，且其中嵌套的字典为缓存共享数据，调用方不要修改）
     """
     if not reasoning.enabled:
-        return {}
-    
-    handlers = {
-        ProviderType.ANTHROPIC: get_anthropic_reasoning_params,
-        ProviderType.OPENAI: get_openai_reasoning_params,
-        ProviderType.GOOGLE: get_gemini_reasoning_params,
-        ProviderType.XAI: get_xai_reasoning_params,
-        ProviderType.DEEPSEEK: get_deepseek_reasoning_params,
-        ProviderType.QWEN: get_qwen_reasoning_params,
-        ProviderType.OPENROUTER: get_openrouter_reasoning_params,
-    }
+        return _EMPTY
     
-    handler = handlers.get(provider)
-    if handler:
-        return handler(reasoning, model_id)
+    # 只缓存常规类型的参数：不可哈希的值无法作为缓存键，
+    # 而 2000 / 2000.0、True / 1 相等却会输出不同的 JSON
+    budget_tokens = reasoning.budget_tokens
+    if (budget_tokens is None or type(budget_tokens) is int) and type(reasoning.include_thoughts) is bool:
+        return _cached_reasoning_params(provider, reasoning, model_id)
     
-    # 默认使用 OpenAI 格式
-    return get_openai_reasoning_params(reasoning, model_id)
+    handler = _REASONING_HANDLERS.get(provider, get_openai_reasoning_params)
+    return handler(reasoning, model_id)
+
+
+# 区分"键不存在"和"值为 None"
+_MISSING = object()
+
+
+def _thinking_budget(thinking: Dict[str, Any]) -> Optional[int]:
+    """读取 thinking 配置中的预算（兼容 budget_tokens / budgetTokens）"""
+    return thinking.get("budget_tokens") or thinking.get("budgetTokens")
 
 
 def parse_reasoning_from_request(body: Dict[str, Any], model_id: str) -> ReasoningParams:
@@ -377,50 +425,60 @@ def parse_reasoning_from_request(body: Dict[str, Any], model_id: str) -> Reasoni
     1. Cherry Studio 格式: providerOptions.xxx.thinking / reasoningEffort
     2. 直接格式: reasoning_effort, enable_thinking, thinking
     """
-    reasoning = ReasoningParams()
+    enabled = False
+    effort = ReasoningEffort.MEDIUM
+    budget_tokens = None
+    include_thoughts = True
     
     # 1. 检查 providerOptions
-    provider_options = body.get("providerOptions", {})
+    provider_options = body.get("providerOptions") or _EMPTY
     
     # Anthropic 格式
-    anthropic_opts = provider_options.get("anthropic", {})
-    if "thinking" in anthropic_opts:
-        thinking = anthropic_opts["thinking"]
-        if isinstance(thinking, dict):
-            reasoning.enabled = thinking.get("type") == "enabled"
-            reasoning.budget_tokens = thinking.get("budget_tokens") or thinking.get("budgetTokens")
+    thinking = provider_options.get("anthropic", _EMPTY).get("thinking")
+    if type(thinking) is dict:
+        enabled = thinking.get("type") == "enabled"
+        budget_tokens = _thinking_budget(thinking)
     
     # OpenAI 格式
-    openai_opts = provider_options.get("openai", {})
-    if "reasoningEffort" in openai_opts:
-        reasoning.enabled = True
-        reasoning.effort = openai_opts["reasoningEffort"]
+    value = provider_options.get("openai", _EMPTY).get("reasoningEffort", _MISSING)
+    if value is not _MISSING:
+        enabled = True
+        effort = normalize_effort(value)
     
     # Google 格式
-    google_opts = provider_options.get("google", {})
-    if "thinkingConfig" in google_opts:
-        thinking_config = google_opts["thinkingConfig"]
-        reasoning.enabled = True
-        reasoning.budget_tokens = thinking_config.get("thinkingBudget")
-        reasoning.include_thoughts = thinking_config.get("includeThoughts", True)
+    thinking_config = provider_options.get("google", _EMPTY).get("thinkingConfig", _MISSING)
+    if thinking_config is not _MISSING:
+        enabled = True
+        budget_tokens = thinking_config.get("thinkingBudget")
+        include_thoughts = thinking_config.get("includeThoughts", True)
     
     # 2. 检查直接参数
-    if "reasoning_effort" in body:
-        reasoning.enabled = True
-        reasoning.effort = body["reasoning_effort"]
-    
-    if "enable_thinking" in body:
-        reasoning.enabled = body["enable_thinking"]
-    
-    if "thinking" in body:
-        thinking = body["thinking"]
-        if isinstance(thinking, dict):
-            reasoning.enabled = thinking.get("type") == "enabled" or thinking.get("enabled", False)
-            reasoning.budget_tokens = thinking.get("budget_tokens") or thinking.get("budgetTokens")
-        elif isinstance(thinking, bool):
-            reasoning.enabled = thinking
-    
-    if "thinking_budget" in body:
-        reasoning.budget_tokens = body["thinking_budget"]
-    
-    return reasoning
+    value = body.get("reasoning_effort", _MISSING)
+    if value is not _MISSING:
+        enabled = True
+        effort = normalize_effort(value)
+    
+    value = body.get("enable_thinking", _MISSING)
+    if value is not _MISSING:
+        enabled = value
+    
+    # JSON 解析结果只会是精确的 dict / bool，直接比较类型
+    thinking = body.get("thinking")
+    thinking_type = type(thinking)
+    if thinking_type is dict:
+        enabled = thinking.get("type") == "enabled" or thinking.get("enabled", False)
+        budget_tokens = _thinking_budget(thinking)
+    elif thinking_type is bool:
+        enabled = thinking
+    
+    value = body.get("thinking_budget", _MISSING)
+    if value is not _MISSING:
+        budget_tokens = value
+    
+    # 解析完成后一次性构建（ReasoningParams 不可变）
+    return ReasoningParams(
+        enabled=bool(enabled),
+        effort=effort,
+        budget_tokens=budget_tokens,
+        include_thoughts=include_thoughts,
+    )
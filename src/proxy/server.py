@@ -4,26 +4,36 @@ Vercel Gateway Proxy Server
 """
 
 import os
-import json
+import sys
+import hmac
 import time
+import queue
+import atexit
+import logging
 import httpx
+import orjson
+import heapq
 import asyncio
 from pathlib import Path
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+from logging.handlers import QueueHandler, QueueListener
 from contextlib import asynccontextmanager
-from collections import defaultdict
+from collections import defaultdict, deque
 
-from fastapi import FastAPI, Request, HTTPException, Header
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import FastAPI, Request, HTTPException, Header, Depends
+from fastapi.responses import Response, StreamingResponse, ORJSONResponse
 from dotenv import load_dotenv
 
+from ..keyfile import load_key_file
+
 # 加载环境变量
 load_dotenv()
 
 # ============== 配置 ==============
 VERCEL_GATEWAY_URL = os.getenv("VERCEL_GATEWAY_URL", "https://ai-gateway.vercel.sh")
 AUTH_KEY = os.getenv("AUTH_KEY", "")
+AUTH_KEY_BYTES = AUTH_KEY.encode()
 COOLDOWN_HOURS = int(os.getenv("COOLDOWN_HOURS", "24"))
 KEYS_FILE = os.getenv("KEYS_FILE", "data/keys/keys_high.txt")
 COOLDOWN_FILE = os.getenv("COOLDOWN_FILE", "data/keys/cooldown_keys.json")
@@ -42,6 +52,31 @@ NORMALIZE_MODEL_ID = os.getenv("NORMALIZE_MODEL_ID", "false").lower() == "true"
 # 模型列表缓存配置
 MODELS_CACHE_TTL = int(os.getenv("MODELS_CACHE_TTL", "3600"))  # 默认1小时
 
+# 同时进行的上游请求上限，超出的请求排队等待，避免连接和缓冲无限增长
+MAX_CONCURRENT_STREAMS = int(os.getenv("MAX_CONCURRENT_STREAMS", "256"))
+
+# 冷却状态写盘间隔（秒）
+COOLDOWN_FLUSH_INTERVAL = int(os.getenv("COOLDOWN_FLUSH_INTERVAL", "5"))
+
+# HTTP/2（可选）：上游支持时多个并发流复用同一连接，需要安装 h2（httpx[http2]）
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = True
+except ImportError:
+    HTTP2_ENABLED = False
+
+# 转发给上游的请求头（其余请求头一律丢弃）
+FORWARD_REQUEST_HEADERS = (
+    "content-type", "content-length", "accept", "accept-encoding", "user-agent",
+    "x-request-id", "anthropic-version", "anthropic-beta",
+)
+
+# 不转发给客户端的逐跳响应头
+HOP_BY_HOP_HEADERS = frozenset({
+    "connection", "keep-alive", "transfer-encoding", "content-length",
+    "proxy-authenticate", "proxy-authorization", "te", "trailer", "upgrade",
+})
+
 # ============== 参数转换模块（可选加载） ==============
 params_converter = None
 model_normalizer = None
@@ -51,30 +86,58 @@ try:
     params_converter = ParamsConverter()
     model_normalizer = params_converter.normalize_model_id
 except ImportError:
-    try:
-        from src.proxy.params import ParamsConverter
-        params_converter = ParamsConverter()
-        model_normalizer = params_converter.normalize_model_id
-    except ImportError:
-        pass
+    pass
 
 # ============== 全局状态 ==============
 api_keys: List[str] = []
-cooldown_keys: Dict[str, str] = {}  # key -> cooldown_until (ISO format)
-key_index = 0
-key_lock = asyncio.Lock()
+cooldown_keys: Dict[str, float] = {}  # key -> 冷却截止时间（epoch 秒）
+cooldown_heap: List[Tuple[float, str]] = []  # (截止时间, key) 最小堆，堆顶最先到期
+available_keys: deque = deque()  # 不在冷却中的密钥，队首为下一个要使用的密钥
+keys_file_signature: Optional[Tuple[int, int]] = None  # 上次加载时密钥文件的 (修改时间, 大小)
+auth_headers: Dict[str, str] = {}  # key -> "Bearer key"
+cooldown_dirty = False  # 冷却状态有未写盘的变化，由后台任务定期保存
+
+# 共享的上游 HTTP 客户端（在 lifespan 中创建），复用连接池避免每次请求重新握手
+http_client: Optional[httpx.AsyncClient] = None
+upstream_http_version: Optional[str] = None
+upstream_stream_slots = asyncio.Semaphore(MAX_CONCURRENT_STREAMS)
 
 # 模型列表缓存
 models_cache: Dict[str, Any] = {
     "data": None,
     "last_updated": None
 }
+models_refresh_task: Optional[asyncio.Task] = None  # 正在进行的上游获取
+
+# /v1/models 序列化结果缓存：provider 过滤条件（空字符串表示不过滤）-> 响应字节
+# 只对 models_payload_source 这份模型列表有效
+MODELS_PAYLOAD_CACHE_SIZE = 64
+models_payload_cache: Dict[str, bytes] = {}
+models_payload_source: Optional[Dict[str, Any]] = None
+
+# 日志：请求路径上只把记录放入队列，时间格式化和写 stdout 在后台线程完成，不阻塞事件循环
+_LOG_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warn": logging.WARNING,
+    "error": logging.ERROR,
+}
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_output = logging.StreamHandler(sys.stdout)
+_log_output.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
+_log_listener = QueueListener(_log_queue, _log_output)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+logger = logging.getLogger("vercel_gateway.proxy")
+logger.setLevel(logging.DEBUG)
+logger.addHandler(QueueHandler(_log_queue))
+logger.propagate = False
 
 # ============== 工具函数 ==============
 def log(level: str, message: str):
-    """统一日志格式"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}] [{level.upper()}] {message}")
+    """统一日志格式（只入队，由后台线程格式化时间并写出）"""
+    logger.log(_LOG_LEVELS.get(level, logging.INFO), f"[{level.upper()}] {message}")
 
 def load_keys() -> List[str]:
     """从文件加载密钥"""
@@ -83,77 +146,139 @@ def load_keys() -> List[str]:
         log("warn", f"密钥文件不存在: {KEYS_FILE}")
         return []
     
-    with open(keys_path, "r") as f:
-        keys = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    keys = load_key_file(keys_path)
     
     log("info", f"从 {keys_path.name} 加载了 {len(keys)} 个密钥")
     return keys
 
-def load_cooldown_keys() -> Dict[str, str]:
+def get_keys_file_signature() -> Optional[Tuple[int, int]]:
+    """密钥文件的 (修改时间, 大小)，文件不存在时返回 None"""
+    try:
+        stat = os.stat(KEYS_FILE)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def load_cooldown_keys() -> Dict[str, float]:
     """加载冷却中的密钥"""
     cooldown_path = Path(COOLDOWN_FILE)
     if not cooldown_path.exists():
         return {}
     
     try:
-        with open(cooldown_path, "r") as f:
-            data = json.load(f)
+        data = orjson.loads(cooldown_path.read_bytes())
         
-        # 清理已过期的冷却密钥
-        now = datetime.now()
+        # 文件中为时间戳；兼容旧版本的 ISO 时间字符串，并清理已过期的冷却密钥
+        now = time.time()
         valid_keys = {}
         for key, until in data.items():
-            if datetime.fromisoformat(until) > now:
-                valid_keys[key] = until
+            if isinstance(until, str):
+                until_ts = datetime.fromisoformat(until).timestamp()
+            else:
+                until_ts = float(until)
+            if until_ts > now:
+                valid_keys[key] = until_ts
         
         return valid_keys
     except Exception as e:
         log("error", f"加载冷却密钥失败: {e}")
         return {}
 
-def save_cooldown_keys():
-    """保存冷却中的密钥"""
+def rebuild_available_keys():
+    """根据 api_keys 和 cooldown_keys 重建可用密钥队列"""
+    global available_keys
+    available_keys = deque(key for key in api_keys if key not in cooldown_keys)
+
+def rebuild_auth_headers():
+    """为每个密钥预先生成 Authorization 头的值"""
+    global auth_headers
+    auth_headers = {key: f"Bearer {key}" for key in api_keys}
+
+def get_auth_header(key: str) -> str:
+    """获取密钥对应的 Authorization 头"""
+    return auth_headers.get(key) or f"Bearer {key}"
+
+def rebuild_cooldown_heap():
+    """根据 cooldown_keys 重建到期时间堆"""
+    global cooldown_heap
+    cooldown_heap = [(until, key) for key, until in cooldown_keys.items()]
+    heapq.heapify(cooldown_heap)
+
+def write_cooldown_file(data: bytes):
+    """写入冷却文件（先写临时文件再替换，避免写到一半时文件损坏）"""
     cooldown_path = Path(COOLDOWN_FILE)
     cooldown_path.parent.mkdir(parents=True, exist_ok=True)
     
-    with open(cooldown_path, "w") as f:
-        json.dump(cooldown_keys, f, indent=2)
+    tmp_path = cooldown_path.with_name(cooldown_path.name + ".tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, cooldown_path)
+
+def save_cooldown_keys():
+    """立即保存冷却中的密钥（关闭时使用）"""
+    global cooldown_dirty
+    cooldown_dirty = False
+    write_cooldown_file(orjson.dumps(cooldown_keys, option=orjson.OPT_INDENT_2))
+
+async def flush_cooldown_keys():
+    """冷却状态有变化时在线程中写盘，不阻塞事件循环"""
+    global cooldown_dirty
+    if not cooldown_dirty:
+        return
+    
+    # 在事件循环中序列化，拿到一致的快照后再交给线程写文件
+    cooldown_dirty = False
+    data = orjson.dumps(cooldown_keys, option=orjson.OPT_INDENT_2)
+    try:
+        await asyncio.to_thread(write_cooldown_file, data)
+    except Exception as e:
+        cooldown_dirty = True
+        log("error", f"保存冷却密钥失败: {e}")
 
 def add_to_cooldown(key: str):
     """将密钥加入冷却"""
-    until = datetime.now() + timedelta(hours=COOLDOWN_HOURS)
-    cooldown_keys[key] = until.isoformat()
-    save_cooldown_keys()
+    until = time.time() + COOLDOWN_HOURS * 3600
+    cooldown_keys[key] = until
+    heapq.heappush(cooldown_heap, (until, key))
+    
+    # 移出可用队列（只在 429 时发生，线性删除即可）
+    global available_keys
+    available_keys = deque(k for k in available_keys if k != key)
+    
+    global cooldown_dirty
+    cooldown_dirty = True
     
     masked_key = f"{key[:8]}****"
-    log("warn", f"密钥 {masked_key} 已加入冷却，直到 {until.strftime('%Y-%m-%d %H:%M')}")
+    log("warn", f"密钥 {masked_key} 已加入冷却，直到 {datetime.fromtimestamp(until).strftime('%Y-%m-%d %H:%M')}")
+
+def release_expired_cooldowns(now: float):
+    """从堆顶弹出已到期的密钥，移出冷却"""
+    global cooldown_dirty
+    while cooldown_heap and cooldown_heap[0][0] <= now:
+        until, key = heapq.heappop(cooldown_heap)
+        # 同一密钥可能被重复加入冷却，只处理与当前截止时间一致的记录
+        if cooldown_keys.get(key) == until:
+            del cooldown_keys[key]
+            # 仍在密钥文件中的密钥放回可用队列
+            if key in api_keys:
+                available_keys.append(key)
+            cooldown_dirty = True
 
-async def get_next_key() -> Optional[str]:
-    """获取下一个可用密钥（轮询）"""
-    global key_index
+def get_next_key() -> Optional[str]:
+    """
+    获取下一个可用密钥（轮询）
     
-    async with key_lock:
-        if not api_keys:
-            return None
-        
-        # 尝试找到一个不在冷却中的密钥
-        for _ in range(len(api_keys)):
-            key = api_keys[key_index]
-            key_index = (key_index + 1) % len(api_keys)
-            
-            # 检查是否在冷却中
-            if key in cooldown_keys:
-                until = datetime.fromisoformat(cooldown_keys[key])
-                if datetime.now() < until:
-                    continue
-                else:
-                    # 冷却已过期，移除
-                    del cooldown_keys[key]
-                    save_cooldown_keys()
-            
-            return key
-        
+    整个过程没有 await，在事件循环中不会被其他协程打断，因此无需加锁。
+    """
+    # 先将已过期的冷却密钥放回队列
+    release_expired_cooldowns(time.time())
+    
+    if not available_keys:
         return None
+    
+    # 取队首密钥并轮转到队尾
+    key = available_keys[0]
+    available_keys.rotate(-1)
+    return key
 
 def verify_auth(authorization: Optional[str]) -> bool:
     """验证请求授权"""
@@ -163,35 +288,40 @@ def verify_auth(authorization: Optional[str]) -> bool:
     if not authorization:
         return False
     
-    # 支持 "Bearer xxx" 或直接 "xxx"
-    token = authorization.replace("Bearer ", "").strip()
-    return token == AUTH_KEY
+    # 支持 "Bearer xxx" 或直接 "xxx"，使用常量时间比较避免时序攻击
+    token = authorization[7:] if authorization.startswith("Bearer ") else authorization
+    return hmac.compare_digest(token.strip().encode(), AUTH_KEY_BYTES)
+
+async def require_auth(authorization: Optional[str] = Header(None)):
+    """路由依赖：校验客户端授权，失败时返回 401"""
+    if not verify_auth(authorization):
+        raise HTTPException(status_code=401, detail="Unauthorized")
 
 # ============== 模型列表获取 ==============
 async def fetch_models_from_upstream(api_key: str) -> Optional[Dict[str, Any]]:
     """从上游 Vercel AI Gateway 获取模型列表"""
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(
-                f"{VERCEL_GATEWAY_URL}/v1/models",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                }
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                log("warn", f"获取模型列表失败: HTTP {response.status_code}")
-                return None
+        response = await http_client.get(
+            f"{VERCEL_GATEWAY_URL}/v1/models",
+            headers={
+                "Authorization": get_auth_header(api_key),
+                "Content-Type": "application/json"
+            },
+            timeout=30.0
+        )
+        
+        if response.status_code == 200:
+            return orjson.loads(response.content)
+        else:
+            log("warn", f"获取模型列表失败: HTTP {response.status_code}")
+            return None
     except Exception as e:
         log("error", f"获取模型列表异常: {e}")
         return None
 
 async def get_models_list(force_refresh: bool = False) -> Dict[str, Any]:
     """获取模型列表（带缓存）"""
-    global models_cache
+    global models_cache, models_refresh_task
     
     now = datetime.now()
     
@@ -202,8 +332,22 @@ async def get_models_list(force_refresh: bool = False) -> Dict[str, Any]:
             if cache_age < MODELS_CACHE_TTL:
                 return models_cache["data"]
     
-    # 从上游获取
-    api_key = await get_next_key()
+    # 从上游获取：并发请求共享同一次获取，不重复消耗请求和密钥
+    if models_refresh_task is None:
+        models_refresh_task = asyncio.create_task(refresh_models_list())
+        models_refresh_task.add_done_callback(_clear_models_refresh_task)
+    # shield：单个客户端断开不会取消其他请求正在等待的获取
+    return await asyncio.shield(models_refresh_task)
+
+def _clear_models_refresh_task(task: asyncio.Task):
+    """获取结束后清除任务，下次缓存过期时重新发起"""
+    global models_refresh_task
+    models_refresh_task = None
+
+async def refresh_models_list() -> Dict[str, Any]:
+    """从上游获取模型列表并更新缓存，失败时返回旧缓存或空列表"""
+    now = datetime.now()
+    api_key = get_next_key()
     if not api_key:
         log("error", "没有可用的 API 密钥来获取模型列表")
         # 如果有旧缓存，返回旧缓存
@@ -227,6 +371,13 @@ async def get_models_list(force_refresh: bool = False) -> Dict[str, Any]:
     return {"object": "list", "data": []}
 
 # ============== 请求处理 ==============
+def needs_body_processing() -> bool:
+    """当前配置下是否需要解析并改写请求体"""
+    return bool(
+        (NORMALIZE_MODEL_ID and model_normalizer)
+        or (ENABLE_PARAMS_CONVERSION and params_converter)
+    )
+
 def process_request_body(body: bytes) -> bytes:
     """
     处理请求体
@@ -239,8 +390,8 @@ def process_request_body(body: bytes) -> bytes:
         return body
     
     try:
-        body_json = json.loads(body)
-    except json.JSONDecodeError:
+        body_json = orjson.loads(body)
+    except orjson.JSONDecodeError:
         return body
     
     modified = False
@@ -258,73 +409,167 @@ def process_request_body(body: bytes) -> bytes:
     # 2. 参数转换（可选）
     if ENABLE_PARAMS_CONVERSION and params_converter:
         try:
-            body_json = params_converter.convert_for_vercel_gateway(body_json)
-            modified = True
+            # 请求体已是标准格式时转换器返回原对象，此时无需重新序列化
+            converted = params_converter.convert_for_vercel_gateway(body_json)
+            if converted is not body_json:
+                body_json = converted
+                modified = True
         except Exception as e:
             log("warn", f"参数转换失败: {e}")
     
     if modified:
-        return json.dumps(body_json).encode()
+        return orjson.dumps(body_json)
     
     return body
 
-async def proxy_request(request: Request, path: str) -> StreamingResponse:
+def upstream_response_headers(response: httpx.Response) -> Dict[str, str]:
+    """上游响应头（去掉逐跳头，由本服务重新生成）"""
+    return {
+        name: value for name, value in response.headers.items()
+        if name not in HOP_BY_HOP_HEADERS
+    }
+
+class UpstreamStreamingResponse(StreamingResponse):
+    """
+    直接透传上游响应
+    
+    原样转发上游状态码、响应头和字节流，不经过额外的生成器包装；
+    响应结束、出错或客户端断开时都会关闭上游连接，并归还并发名额。
+    """
+    
+    def __init__(self, upstream: httpx.Response):
+        headers = upstream_response_headers(upstream)
+        # 禁止 Nginx 等反向代理缓冲 SSE
+        headers["x-accel-buffering"] = "no"
+        super().__init__(
+            upstream.aiter_raw(),
+            status_code=upstream.status_code,
+            headers=headers,
+            media_type=None if "content-type" in headers else "text/event-stream"
+        )
+        self.upstream = upstream
+    
+    async def stream_response(self, send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        try:
+            # 原样转发上游字节（包括压缩编码），不在代理内解码
+            async for chunk in self.body_iterator:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        except httpx.HTTPError as e:
+            log("error", f"代理请求失败: {e}")
+            await send({"type": "http.response.body", "body": orjson.dumps({"error": str(e)}), "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.upstream.aclose()
+            upstream_stream_slots.release()
+
+async def proxy_request(request: Request, path: str) -> Response:
     """代理请求到 Vercel AI Gateway"""
     
     # 获取可用密钥
-    api_key = await get_next_key()
+    api_key = get_next_key()
     if not api_key:
         raise HTTPException(status_code=503, detail="No available API keys")
     
-    # 读取并处理请求体
-    body = await request.body()
-    body = process_request_body(body)
+    # 构建请求头：只转发白名单内的头，客户端的认证信息不会发往上游
+    request_headers = request.headers
+    headers = {
+        "authorization": get_auth_header(api_key),
+        # 响应体原样透传，客户端未声明时不让上游压缩
+        "accept-encoding": "identity",
+    }
+    for name in FORWARD_REQUEST_HEADERS:
+        value = request_headers.get(name)
+        if value is not None:
+            headers[name] = value
+    
+    # 处理请求体：只有需要改写 JSON 时才完整读入，否则边收边转发给上游
+    content_type = headers.get("content-type", "")
+    if needs_body_processing() and (not content_type or "json" in content_type):
+        body = process_request_body(await request.body())
+        headers.pop("content-length", None)
+    elif "content-length" in headers or "transfer-encoding" in request_headers:
+        # 原样转发，保留客户端的 content-length（没有时 httpx 使用分块传输）
+        body = request.stream()
+    else:
+        body = None
     
     # 构建目标 URL
     target_url = f"{VERCEL_GATEWAY_URL}/{path}"
     if request.query_params:
         target_url += f"?{request.query_params}"
     
-    # 构建请求头
-    headers = dict(request.headers)
-    headers["Authorization"] = f"Bearer {api_key}"
-    headers.pop("host", None)
-    headers.pop("content-length", None)
-    
-    # 发送请求
-    async def stream_response():
-        try:
-            async with httpx.AsyncClient(timeout=300.0) as client:
-                async with client.stream(
-                    method=request.method,
-                    url=target_url,
-                    headers=headers,
-                    content=body
-                ) as response:
-                    # 检查是否需要冷却
-                    if response.status_code == 429:
-                        add_to_cooldown(api_key)
-                    
-                    async for chunk in response.aiter_bytes():
-                        yield chunk
-        except Exception as e:
-            log("error", f"代理请求失败: {e}")
-            yield json.dumps({"error": str(e)}).encode()
-    
-    return StreamingResponse(
-        stream_response(),
-        media_type="text/event-stream"
-    )
+    # 发送请求：在返回响应之前完成请求体的转发，
+    # 响应开始后 Starlette 会接管 receive 监听客户端断开，不能再读取请求体
+    # 并发上游流达到上限时在这里排队，连接建立前就施加背压
+    await upstream_stream_slots.acquire()
+    response = None
+    handed_over = False  # 交给 UpstreamStreamingResponse 后由它负责关闭连接、归还名额
+    try:
+        upstream_request = http_client.build_request(
+            method=request.method,
+            url=target_url,
+            headers=headers,
+            content=body
+        )
+        response = await http_client.send(upstream_request, stream=True)
+        
+        # 首次请求时记录实际协商的协议版本
+        global upstream_http_version
+        if upstream_http_version is None:
+            upstream_http_version = response.http_version
+            log("info", f"上游协议: {upstream_http_version}")
+        
+        # 检查是否需要冷却
+        if response.status_code == 429:
+            add_to_cooldown(api_key)
+        
+        upstream = UpstreamStreamingResponse(response)
+        handed_over = True
+        return upstream
+    except Exception as e:
+        log("error", f"代理请求失败: {e}")
+        return StreamingResponse(
+            iter([orjson.dumps({"error": str(e)})]),
+            media_type="text/event-stream"
+        )
+    finally:
+        # 出错或被取消（包括 CancelledError）时在这里释放，避免名额永久丢失
+        if not handed_over:
+            try:
+                if response is not None:
+                    await response.aclose()
+            finally:
+                upstream_stream_slots.release()
 
 # ============== 生命周期 ==============
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    global api_keys, cooldown_keys
+    global api_keys, cooldown_keys, http_client, keys_file_signature
     
-    # 启动时加载密钥
+    # 启动时加载密钥（先记录文件状态，读取期间的修改会在下次检查时重新加载）
+    keys_file_signature = get_keys_file_signature()
     api_keys = load_keys()
     cooldown_keys = load_cooldown_keys()
+    rebuild_cooldown_heap()
+    rebuild_available_keys()
+    rebuild_auth_headers()
+    
+    # 创建共享的上游客户端
+    http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(300.0, connect=30.0),
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=100, keepalive_expiry=60.0),
+        http2=HTTP2_ENABLED
+    )
     
     # 确定当前模式
     if ENABLE_PARAMS_CONVERSION:
@@ -342,6 +587,7 @@ async def lifespan(app: FastAPI):
     log("info", f"认证密钥: {AUTH_KEY[:4]}****" if AUTH_KEY else "认证密钥: 未设置")
     log("info", f"工作模式: {mode}")
     log("info", f"模型缓存: {MODELS_CACHE_TTL} 秒")
+    log("info", f"上游 HTTP/2: {'已启用' if HTTP2_ENABLED else '未安装 h2，使用 HTTP/1.1'}")
     log("info", "=" * 60)
     log("info", "提示: Cherry Studio 用户建议使用默认透传模式")
     log("info", "=" * 60)
@@ -350,20 +596,42 @@ async def lifespan(app: FastAPI):
     async def reload_keys_periodically():
         while True:
             await asyncio.sleep(300)  # 每5分钟
-            global api_keys
-            api_keys = load_keys()
+            global api_keys, keys_file_signature
+            # 文件未修改时跳过重新读取
+            signature = get_keys_file_signature()
+            if signature == keys_file_signature:
+                continue
+            keys_file_signature = signature
+            keys = load_keys()
+            # 密钥未变化时保留当前轮询位置
+            if keys != api_keys:
+                api_keys = keys
+                rebuild_available_keys()
+                rebuild_auth_headers()
+    
+    # 定时保存冷却状态
+    async def flush_cooldown_periodically():
+        while True:
+            await asyncio.sleep(COOLDOWN_FLUSH_INTERVAL)
+            await flush_cooldown_keys()
     
     task = asyncio.create_task(reload_keys_periodically())
+    flush_task = asyncio.create_task(flush_cooldown_periodically())
     
     yield
     
     task.cancel()
+    flush_task.cancel()
+    if cooldown_dirty:
+        save_cooldown_keys()
+    await http_client.aclose()
 
 # ============== FastAPI 应用 ==============
 app = FastAPI(
     title="Vercel Gateway Proxy",
     version="3.2.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse  # 路由返回的 dict 用 orjson 序列化
 )
 
 @app.get("/")
@@ -378,44 +646,52 @@ async def root():
         "mode": "passthrough" if not ENABLE_PARAMS_CONVERSION else "conversion"
     }
 
+# 健康检查响应固定不变，只序列化一次
+HEALTH_PAYLOAD = orjson.dumps({"status": "healthy"})
+
 @app.get("/health")
 async def health():
     """健康检查端点"""
-    return {"status": "healthy"}
+    return Response(content=HEALTH_PAYLOAD, media_type="application/json")
 
-@app.get("/v1/models")
+@app.get("/v1/models", dependencies=[Depends(require_auth)])
 async def list_models(
-    authorization: Optional[str] = Header(None),
     provider: Optional[str] = None,
     refresh: Optional[bool] = False
 ):
     """获取模型列表（从上游 Vercel AI Gateway 自动获取）"""
-    if not verify_auth(authorization):
-        raise HTTPException(status_code=401, detail="Unauthorized")
+    global models_payload_source
     
     # 获取模型列表
     models_response = await get_models_list(force_refresh=refresh)
     
-    # 按 provider 过滤
-    if provider and models_response.get("data"):
-        filtered_data = [
-            m for m in models_response["data"]
-            if m.get("id", "").startswith(f"{provider}/") or 
-               m.get("owned_by", "") == provider
-        ]
-        return {"object": "list", "data": filtered_data}
-    
-    return models_response
-
-@app.get("/v1/models/{model_id:path}")
-async def get_model(
-    model_id: str,
-    authorization: Optional[str] = Header(None)
-):
-    """获取单个模型详情"""
-    if not verify_auth(authorization):
-        raise HTTPException(status_code=401, detail="Unauthorized")
+    # 模型列表更新后，之前序列化好的响应全部作废
+    if models_response is not models_payload_source:
+        models_payload_cache.clear()
+        models_payload_source = models_response
+    
+    cache_key = provider or ""
+    payload = models_payload_cache.get(cache_key)
+    if payload is None:
+        # 按 provider 过滤
+        if provider and models_response.get("data"):
+            filtered_data = [
+                m for m in models_response["data"]
+                if m.get("id", "").startswith(f"{provider}/") or 
+                   m.get("owned_by", "") == provider
+            ]
+            payload = orjson.dumps({"object": "list", "data": filtered_data})
+        else:
+            payload = orjson.dumps(models_response)
+        
+        if len(models_payload_cache) < MODELS_PAYLOAD_CACHE_SIZE:
+            models_payload_cache[cache_key] = payload
     
+    return Response(content=payload, media_type="application/json")
+
+@app.get("/v1/models/{model_id:path}", dependencies=[Depends(require_auth)])
+async def get_model(model_id: str):
+    """获取单个模型详情"""
     models_response = await get_models_list()
     
     for model in models_response.get("data", []):
@@ -424,26 +700,12 @@ async def get_model(
     
     raise HTTPException(status_code=404, detail=f"Model '{model_id}' not found")
 
-@app.api_route("/v1/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
-async def proxy_v1(
-    request: Request,
-    path: str,
-    authorization: Optional[str] = Header(None)
-):
+@app.api_route("/v1/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"], dependencies=[Depends(require_auth)])
+async def proxy_v1(request: Request, path: str):
     """代理 /v1/* 请求"""
-    if not verify_auth(authorization):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    
     return await proxy_request(request, f"v1/{path}")
 
-@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
-async def proxy_all(
-    request: Request,
-    path: str,
-    authorization: Optional[str] = Header(None)
-):
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"], dependencies=[Depends(require_auth)])
+async def proxy_all(request: Request, path: str):
     """代理其他请求"""
-    if not verify_auth(authorization):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    
     return await proxy_request(request, path)
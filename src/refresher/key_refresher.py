@@ -5,14 +5,20 @@ Vercel API Key 自动刷新工具
 每天自动调用所有密钥，触发额度刷新机制
 """
 
-import requests
-import json
+import asyncio
+import httpx
+import orjson
 import time
 import os
 import sys
+import random
 import logging
 from pathlib import Path
 from datetime import datetime
+from collections import Counter, deque
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from src.keyfile import load_key_file
 
 # 配置
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -20,6 +26,28 @@ LOGS_DIR = BASE_DIR / "logs"
 KEYS_DIR = BASE_DIR / "data/keys"
 REPORTS_DIR = BASE_DIR / "data/reports"
 
+# 同时进行的刷新请求数
+REFRESH_CONCURRENCY = int(os.getenv("REFRESH_CONCURRENCY", "8"))
+# 每分钟最多发出的刷新请求数（0 表示不限）
+REFRESH_RPM = int(os.getenv("REFRESH_RPM", "60"))
+# 超时、连接失败或上游临时错误时的最多重试次数
+REFRESH_RETRIES = int(os.getenv("REFRESH_RETRIES", "2"))
+# 需要重试的 HTTP 状态码
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# 重试退避：第 n 次重试等待 min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2^(n-1)) 秒再加随机抖动
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+# HTTP/2（可选）：上游支持时所有并发刷新请求复用同一连接，需要安装 h2（httpx[http2]）
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = True
+except ImportError:
+    HTTP2_ENABLED = False
+
+# 每完成多少个密钥输出一次进度
+PROGRESS_BATCH_SIZE = 50
+
 # 确保目录存在
 LOGS_DIR.mkdir(parents=True, exist_ok=True)
 REPORTS_DIR.mkdir(parents=True, exist_ok=True)
@@ -33,103 +61,356 @@ logging.basicConfig(
         logging.StreamHandler()
     ]
 )
+# httpx 每个请求都会输出一行 INFO 日志，只保留警告以上
+logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 
+class SlidingWindowLimiter:
+    """
+    滑动窗口限速器
+    任意 window 秒内最多放行 rpm 个请求（rpm <= 0 表示不限），
+    上游返回 retry-after 时所有请求一起暂停。
+    clock / sleep 可替换为假时钟，便于自检。
+    """
+
+    def __init__(
+        self,
+        rpm: int,
+        window: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep
+    ):
+        self.rpm = rpm
+        self.window = window
+        self._clock = clock
+        self._sleep = sleep
+        self._sent = deque()  # 窗口内已放行请求的时间
+        self._resume_at = 0.0  # 暂停截止时间
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        """等待到可以发出下一个请求（按到达顺序放行）"""
+        async with self._lock:
+            while True:
+                now = self._clock()
+                delay = self._resume_at - now
+                if self.rpm > 0:
+                    while self._sent and now - self._sent[0] >= self.window:
+                        self._sent.popleft()
+                    if len(self._sent) >= self.rpm:
+                        delay = max(delay, self._sent[0] + self.window - now)
+                if delay <= 0:
+                    break
+                await self._sleep(delay)
+
+            if self.rpm > 0:
+                self._sent.append(now)
+
+    def pause(self, seconds: float):
+        """暂停放行 seconds 秒"""
+        self._resume_at = max(self._resume_at, self._clock() + seconds)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD 自适应并发控制
+    响应正常且平均延迟不超过目标时并发数 +0.5，遇到 429/502/503/504、
+    超时或平均延迟过高时减半；连续出错超过阈值则熔断暂停一段时间。
+    clock / sleep 可替换为假时钟，便于自检。
+    """
+
+    OVERLOAD_STATUS_CODES = (429, 502, 503, 504)
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        latency_target: float = 10.0,
+        window: int = 20,
+        failure_threshold: int = 3,
+        open_seconds: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep
+    ):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(self.max_limit)  # 当前并发上限
+        self.latency_target = latency_target
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self._clock = clock
+        self._sleep = sleep
+        self._latencies = deque(maxlen=window)  # 最近 window 次响应的耗时
+        self._in_flight = 0
+        self._failures = 0  # 连续出错次数
+        self._open_until = 0.0  # 熔断截止时间
+        self._released = asyncio.Event()
+
+    async def acquire(self):
+        """等待到有空闲并发名额且未处于熔断状态"""
+        while True:
+            delay = self._open_until - self._clock()
+            if delay > 0:
+                await self._sleep(delay)
+                continue
+            if self._in_flight < int(self.limit):
+                self._in_flight += 1
+                return
+            self._released.clear()
+            await self._released.wait()
+
+    def release(self, latency: float, status_code: Optional[int]):
+        """归还名额并根据本次结果调整并发数（status_code 为 None 表示超时或连接失败）"""
+        self._in_flight -= 1
+        self._latencies.append(latency)
+        mean_latency = sum(self._latencies) / len(self._latencies)
+
+        overloaded = status_code is None or status_code in self.OVERLOAD_STATUS_CODES
+        if overloaded or mean_latency > self.latency_target:
+            self.limit = max(self.min_limit, self.limit * 0.5)
+        elif status_code == 200:
+            self.limit = min(self.max_limit, self.limit + 0.5)
+
+        if overloaded:
+            self._failures += 1
+            if self._failures > self.failure_threshold:
+                logger.warning("连续 %d 次出错，暂停 %g 秒", self._failures, self.open_seconds)
+                self._open_until = self._clock() + self.open_seconds
+                self._failures = 0
+        else:
+            self._failures = 0
+
+        self._released.set()
+
+
+def backoff_delay(attempt: int) -> float:
+    """第 attempt 次重试前的等待时间（指数退避 + 随机抖动，避免所有重试同时打到上游）"""
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)) + random.uniform(0, RETRY_BASE_DELAY)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 retry-after 头（只支持秒数格式）"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        return None
+    return seconds if seconds > 0 else None
+
+
+async def read_text_head(response: httpx.Response, limit: int) -> str:
+    """流式读取响应体，只取前 limit 个字符"""
+    text = ""
+    async for chunk in response.aiter_text():
+        text += chunk
+        if len(text) >= limit:
+            break
+    return text[:limit]
+
+
 class VercelKeyRefresher:
     """Vercel 密钥刷新器"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        max_concurrency: int = REFRESH_CONCURRENCY,
+        rpm: int = REFRESH_RPM,
+        retries: int = REFRESH_RETRIES
+    ):
         self.base_url = "https://ai-gateway.vercel.sh/v1/chat/completions"
         # 使用最便宜的模型
         self.model = "anthropic/claude-3-haiku"
-        self.interval = 2  # 每个密钥之间间隔秒数
-
-    def refresh_single_key(self, api_key: str, index: int, total: int) -> dict:
-        """刷新单个密钥"""
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
-
-        # 最小请求，减少消耗
-        payload = {
+        self.headers_template = {"Content-Type": "application/json"}
+        # 最小请求，减少消耗；所有密钥的请求体相同，只序列化一次
+        self.payload = orjson.dumps({
             "model": self.model,
             "messages": [{"role": "user", "content": "1"}],
             "max_tokens": 1
-        }
-
+        })
+        # 同时进行的刷新请求数，用于保护上游
+        self.max_concurrency = max_concurrency
+        self.rpm = rpm
+        self.retries = max(0, retries)
+        # 所有密钥共用一个连接池，连接保持复用，避免每个密钥重新握手 TLS
+        # （HTTP/2 下只用一个连接，这里的上限只在回退到 HTTP/1.1 时生效）
+        self.limits = httpx.Limits(
+            max_connections=max_concurrency,
+            max_keepalive_connections=max_concurrency,
+            keepalive_expiry=60
+        )
+
+    async def refresh_single_key(
+        self,
+        client: httpx.AsyncClient,
+        concurrency: AdaptiveConcurrencyLimiter,
+        limiter: SlidingWindowLimiter,
+        api_key: str,
+        index: int,
+        total: int
+    ) -> dict:
+        """刷新单个密钥（超时、连接失败或上游临时错误时退避重试）"""
+        # 每个密钥只构造一次，重试时复用
+        headers = {"Authorization": f"Bearer {api_key}"}
         key_display = f"{api_key[:12]}...{api_key[-4:]}"
 
+        attempt = 1
+        while True:
+            result, retry_after = await self._refresh_once(
+                client, concurrency, limiter, headers, key_display, index, total
+            )
+            retryable = (
+                result["status"] in ("timeout", "error")
+                or result.get("code") in RETRY_STATUS_CODES
+            )
+            if not retryable or attempt > self.retries:
+                break
+
+            # 优先按上游给出的 retry-after 等待，等太久则放弃
+            delay = retry_after or backoff_delay(attempt)
+            if delay > RETRY_MAX_DELAY:
+                break
+            logger.info("[%d/%d] 🔁 %s - %.1f 秒后第 %d 次重试", index, total, key_display, delay, attempt)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        result["attempts"] = attempt
+        return result
+
+    async def _refresh_once(
+        self,
+        client: httpx.AsyncClient,
+        concurrency: AdaptiveConcurrencyLimiter,
+        limiter: SlidingWindowLimiter,
+        headers: Dict[str, str],
+        key_display: str,
+        index: int,
+        total: int
+    ) -> Tuple[dict, Optional[float]]:
+        """发出一次刷新请求，返回结果和上游要求的等待秒数"""
+        await concurrency.acquire()
+        started = time.perf_counter()
+        status_code = None
+        retry_after = None
         try:
-            logger.info(f"[{index}/{total}] 正在刷新: {key_display}")
+            await limiter.wait()
+            started = time.perf_counter()  # 限速等待不计入响应耗时
+            logger.info("[%d/%d] 正在刷新: %s", index, total, key_display)
 
-            response = requests.post(
+            async with client.stream(
+                "POST",
                 self.base_url,
                 headers=headers,
-                json=payload,
-                timeout=30
-            )
-
-            if response.status_code == 200:
-                logger.info(f"[{index}/{total}] ✅ {key_display} - 成功")
-                return {
-                    "key": key_display,
-                    "status": "success",
-                    "code": 200
-                }
-            else:
-                # 即使失败也触发了刷新检查
-                logger.info(f"[{index}/{total}] ⚠️  {key_display} - HTTP {response.status_code}")
-                return {
-                    "key": key_display,
-                    "status": "triggered",
-                    "code": response.status_code,
-                    "message": response.text[:100]
-                }
-
-        except requests.exceptions.Timeout:
-            logger.warning(f"[{index}/{total}] ⏱️  {key_display} - 超时")
+                content=self.payload
+            ) as response:
+                status_code = response.status_code
+                latency_ms = round((time.perf_counter() - started) * 1000)  # 收到响应头的耗时
+
+                # 上游要求等待时，所有后续请求一起暂停
+                retry_after = parse_retry_after(response.headers.get("retry-after"))
+                if retry_after:
+                    logger.warning("上游要求等待 %g 秒", retry_after)
+                    limiter.pause(retry_after)
+
+                if response.status_code == 200:
+                    # 成功时不解析内容，只把（很小的）响应体读完，让连接回到连接池复用
+                    await response.aread()
+                    logger.info("[%d/%d] ✅ %s - 成功", index, total, key_display)
+                    return {
+                        "key": key_display,
+                        "status": "success",
+                        "code": 200,
+                        "latency_ms": latency_ms
+                    }, retry_after
+                else:
+                    # 即使失败也触发了刷新检查，错误信息只读前 100 个字符
+                    logger.info("[%d/%d] ⚠️  %s - HTTP %d", index, total, key_display, response.status_code)
+                    return {
+                        "key": key_display,
+                        "status": "triggered",
+                        "code": response.status_code,
+                        "latency_ms": latency_ms,
+                        "message": await read_text_head(response, 100)
+                    }, retry_after
+
+        except httpx.TimeoutException:
+            logger.warning("[%d/%d] ⏱️  %s - 超时", index, total, key_display)
             return {
                 "key": key_display,
                 "status": "timeout"
-            }
+            }, None
         except Exception as e:
-            logger.error(f"[{index}/{total}] ❌ {key_display} - {str(e)}")
+            logger.error("[%d/%d] ❌ %s - %s", index, total, key_display, e)
             return {
                 "key": key_display,
                 "status": "error",
                 "error": str(e)
-            }
+            }, None
+        finally:
+            concurrency.release(time.perf_counter() - started, status_code)
+
+    async def _refresh_all_keys(self, api_keys: list) -> Tuple[list, Counter]:
+        """
+        在单个事件循环中并发刷新所有密钥
+        返回按密钥顺序排列的结果和各状态计数，完成过程中定期输出进度
+        """
+        total = len(api_keys)
+        results = [None] * total
+        counts = Counter()
+        concurrency = AdaptiveConcurrencyLimiter(self.max_concurrency)
+        limiter = SlidingWindowLimiter(self.rpm)
+        async with httpx.AsyncClient(
+            headers=self.headers_template,
+            timeout=30,
+            limits=self.limits,
+            http2=HTTP2_ENABLED
+        ) as client:
+            async def refresh(index: int, api_key: str) -> Tuple[int, dict]:
+                return index, await self.refresh_single_key(
+                    client, concurrency, limiter, api_key, index, total
+                )
+
+            tasks = [
+                asyncio.create_task(refresh(i, key))
+                for i, key in enumerate(api_keys, 1)
+            ]
+            for completed, future in enumerate(asyncio.as_completed(tasks), 1):
+                index, result = await future
+                results[index - 1] = result
+                counts[result["status"]] += 1
+                if completed % PROGRESS_BATCH_SIZE == 0 or completed == total:
+                    logger.info("进度: %d/%d，成功 %d", completed, total, counts["success"])
+
+        return results, counts
 
     def refresh_all_keys(self, api_keys: list) -> list:
-        """刷新所有密钥"""
+        """刷新所有密钥（重复的密钥只刷新一次）"""
+        unique_keys = list(dict.fromkeys(api_keys))
+        if len(unique_keys) < len(api_keys):
+            logger.info("跳过 %d 个重复密钥", len(api_keys) - len(unique_keys))
+            api_keys = unique_keys
         total = len(api_keys)
-        results = []
 
         logger.info("=" * 60)
         logger.info(f"Vercel Key 刷新任务启动")
         logger.info(f"密钥数量: {total}")
-        logger.info(f"间隔时间: {self.interval} 秒")
+        logger.info(f"并发数: {self.max_concurrency}")
+        logger.info(f"每分钟请求上限: {self.rpm if self.rpm > 0 else '不限'}")
+        logger.info(f"HTTP/2: {'已启用' if HTTP2_ENABLED else '未安装 h2，使用 HTTP/1.1'}")
         logger.info("=" * 60)
 
-        start_time = time.time()
+        start_time = time.perf_counter()
 
-        for i, key in enumerate(api_keys, 1):
-            result = self.refresh_single_key(key, i, total)
-            results.append(result)
-            
-            # 最后一个不需要等待
-            if i < total:
-                time.sleep(self.interval)
+        results, counts = asyncio.run(self._refresh_all_keys(api_keys))
 
-        elapsed = time.time() - start_time
+        elapsed = time.perf_counter() - start_time
 
         # 统计
-        success = len([r for r in results if r["status"] == "success"])
-        triggered = len([r for r in results if r["status"] == "triggered"])
-        timeout = len([r for r in results if r["status"] == "timeout"])
-        error = len([r for r in results if r["status"] == "error"])
+        success = counts["success"]
+        triggered = counts["triggered"]
+        timeout = counts["timeout"]
+        error = counts["error"]
 
         logger.info("=" * 60)
         logger.info("刷新完成 - 统计报告")
@@ -157,7 +438,7 @@ class VercelKeyRefresher:
         }
 
         report_file = REPORTS_DIR / "refresh_report.json"
-        report_file.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        report_file.write_bytes(orjson.dumps(report, option=orjson.OPT_INDENT_2))
         logger.info(f"报告已保存: {report_file}")
 
         return results
@@ -176,8 +457,7 @@ def main():
 
     for key_file in key_files:
         if key_file.exists():
-            content = key_file.read_text()
-            keys = [k.strip() for k in content.split('\n') if k.strip()]
+            keys = load_key_file(key_file)
             if keys:
                 api_keys = keys
                 used_file = key_file